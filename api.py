@@ -0,0 +1,169 @@
+import json
+from datetime import datetime
+from flask import (Blueprint, request, jsonify, url_for, abort, current_app,
+                   Response, stream_with_context)
+from models import Venue, Artist, show_sides
+from facets import parse_filters, apply_filters
+from listings import entity_shows, show_section, show_feed, iter_shows, current_counts
+from pagination import encode_id_cursor, decode_id_cursor, decode_cursor
+from serializers import (venue_dict, artist_dict, venue_fields, artist_fields, show_fields,
+                         parse_fields, select_fields, jsonable)
+
+#----------------------------------------------------------------------------#
+# JSON API, version 1.
+#----------------------------------------------------------------------------#
+# Read-only JSON for venues, artists and shows, built by the same
+# serializers as the pages. Lists are cursor paginated: every response has
+# a "next" URL, null on the last page. ?fields=id,name picks the fields of
+# each item, ?limit= the page size (API_PAGE_SIZE, at most
+# API_MAX_PAGE_SIZE).
+#
+#   /api/v1/venues?genre=&city=&state=        venues by id
+#   /api/v1/venues/<id>                       one venue with its shows
+#   /api/v1/venues/<id>/shows/upcoming|past   more shows of a venue
+#   (the same for /api/v1/artists)
+#   /api/v1/shows?from=&to=                   shows, newest first
+#   /api/v1/shows.ndjson?from=&to=            all those shows, streamed
+#
+# from and to are ISO 8601 times, shows starting in [from, to).
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+resources = {
+  'venues': (Venue, venue_dict, venue_fields),
+  'artists': (Artist, artist_dict, artist_fields),
+}
+section_fields = ('past_shows', 'upcoming_shows', 'past_shows_next', 'upcoming_shows_next')
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+  return jsonify({"error": error.description}), error.code
+
+#  Arguments
+#  ----------------------------------------------------------------
+
+def fields_arg(allowed):
+  try:
+    return parse_fields(request.args.get('fields'), allowed)
+  except ValueError as e:
+    abort(400, str(e))
+
+def limit_arg():
+  limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+  return min(max(limit, 1), current_app.config['API_MAX_PAGE_SIZE'])
+
+def cursor_arg(decode):
+  cursor = request.args.get('cursor')
+  if not cursor:
+    return None
+  try:
+    return decode(cursor)
+  except ValueError as e:
+    abort(400, str(e))
+
+def time_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return datetime.fromisoformat(value)
+  except ValueError:
+    abort(400, f'{name} is not an ISO 8601 time: {value!r}')
+
+def next_url(cursor):
+  # this request's URL with the cursor of the next page
+  if not cursor:
+    return None
+  args = dict(request.args.to_dict(flat=False), **request.view_args)
+  args['cursor'] = cursor
+  return url_for(request.endpoint, **args)
+
+def page(items, fields, cursor):
+  return jsonify({
+    "data": [jsonable(select_fields(item, fields)) for item in items],
+    "next": next_url(cursor)
+  })
+
+#  Venues and artists
+#  ----------------------------------------------------------------
+
+def serialize_counted(rows, serialize, fields):
+  # stale stored show counts are recounted, as on the venue/artist pages
+  data = [serialize(row) for row in rows]
+  if rows and (fields is None or {'upcoming_shows_count', 'past_shows_count'} & set(fields)):
+    counts = current_counts(rows, datetime.now())
+    for item in data:
+      item['upcoming_shows_count'], item['past_shows_count'] = counts[item['id']]
+  return data
+
+@api.route('/<any(venues, artists):kind>')
+def entities(kind):
+  model, serialize, allowed = resources[kind]
+  fields = fields_arg(allowed)
+  limit = limit_arg()
+  query = apply_filters(model.query, model, parse_filters(request.args))
+  cursor = cursor_arg(decode_id_cursor)
+  if cursor is not None:
+    query = query.filter(model.id > cursor)
+
+  rows = query.order_by(model.id).limit(limit + 1).all()
+  next_cursor = encode_id_cursor(rows[limit - 1].id) if len(rows) > limit else None
+  return page(serialize_counted(rows[:limit], serialize, fields), fields, next_cursor)
+
+@api.route('/<any(venues, artists):kind>/<int:id>')
+def entity(kind, id):
+  model, serialize, allowed = resources[kind]
+  fields = fields_arg(allowed + section_fields)
+  row = model.query.get_or_404(id, description=f'No {kind[:-1]} with id {id}.')
+
+  # the show sections cost two queries, only run them when asked for; they
+  # come with current show counts
+  if fields is None or set(fields) & set(section_fields):
+    data = serialize(row)
+    shows, next_cursors = entity_shows(row, datetime.now())
+    data.update(shows)
+    for when, cursor in next_cursors.items():
+      data[f'{when}_shows_next'] = cursor and url_for(
+        'api.entity_shows_page', kind=kind, id=id, when=when, cursor=cursor)
+  else:
+    data = serialize_counted([row], serialize, fields)[0]
+  return jsonify(jsonable(select_fields(data, fields)))
+
+@api.route('/<any(venues, artists):kind>/<int:id>/shows/<any(upcoming, past):when>')
+def entity_shows_page(kind, id, when):
+  column, other, other_column = show_sides(Venue if kind == 'venues' else Artist)
+  shows, next_cursor = show_section(column, id, other, when, datetime.now(),
+                                    cursor_arg(decode_cursor))
+  return page(shows, None, next_cursor)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+def shows():
+  fields = fields_arg(show_fields)
+  shows, next_cursor = show_feed(cursor_arg(decode_cursor), limit_arg(),
+                                 time_arg('from'), time_arg('to'))
+  return page(shows, fields, next_cursor)
+
+@api.route('/shows.ndjson')
+def shows_ndjson():
+  # one JSON object per line, oldest first. Rows come from a server-side
+  # cursor and are written as they are read, so memory stays flat however
+  # many shows there are.
+  fields = fields_arg(show_fields)
+  start, end = time_arg('from'), time_arg('to')
+  chunk_size = current_app.config['API_STREAM_CHUNK_SIZE']
+
+  def generate():
+    lines = []
+    for show in iter_shows(start, end, chunk_size):
+      lines.append(json.dumps(jsonable(select_fields(show, fields))))
+      if len(lines) == chunk_size:
+        yield '\n'.join(lines) + '\n'
+        lines = []
+    if lines:
+      yield '\n'.join(lines) + '\n'
+
+  return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -4,138 +4,234 @@
 import json
 import dateutil.parser
 import babel
-from flask import (Flask, render_template, 
+import babel.dates
+import os
+import weakref
+from flask import (Flask, Blueprint, render_template, 
                    request, Response, flash, 
-                   redirect, url_for)
+                   redirect, url_for, abort,
+                   make_response, session, current_app, jsonify, g,
+                   stream_with_context)
 import logging
-from logging import Formatter, FileHandler
 from sqlalchemy.exc import SQLAlchemyError
 from forms import *
 from models import *
-from datetime import datetime
+import config
+from pagination import decode_cursor, page_count
+from listings import entity_shows, show_section, show_feed, iter_upcoming
+from serializers import venue_dict, artist_dict, job_dict, jsonable
+from search import search
+from cli import register_commands
+from cache import page_cache
+import bookings
+import jobs
+import calendars
+from calendars import feeds
+from jobs import runner
+from facets import parse_filters, apply_filters, facet_counts
+from metrics import metrics
+from logs import logs
+from replicas import replicas, read_only
+from suggest import suggestions
+from api import api
+from assets import assets
+from fragments import fragments, warm as warm_templates
+import versions
+from versions import conditional
+from datetime import datetime, timedelta
+from functools import lru_cache
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+datetime_formats = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
 
-app.jinja_env.filters['datetime'] = format_datetime
+@lru_cache(maxsize=64)
+def datetime_pattern(format, locale):
+  # compiled babel pattern and parsed locale, built once per (format, locale)
+  return (babel.dates.parse_pattern(datetime_formats.get(format, format)),
+          babel.Locale.parse(locale))
+
+def format_datetime(value, format='medium', locale=None):
+  # views pass datetime objects; strings are still parsed for old callers
+  if not isinstance(value, datetime):
+    value = dateutil.parser.parse(value)
+  pattern, locale = datetime_pattern(format, locale or babel.dates.LC_TIME)
+  return pattern.apply(value, locale)
+
+#----------------------------------------------------------------------------#
+# App.
+#----------------------------------------------------------------------------#
+
+# all pages are registered on this blueprint by create_app() below
+main = Blueprint('main', __name__)
+log = logging.getLogger('fyyur.views')
+
+page_cache.listen(db.session, Venue, Artist, Show)
+suggestions.listen(db.session)
+versions.listen(db.session)
+
+#----------------------------------------------------------------------------#
+# Page helpers.
+#----------------------------------------------------------------------------#
+
+def cached_page(key, render):
+  """Serve the page cached under `key` and the page version set by
+  @conditional, or call render() -> (html, ttl) and cache its result for
+  ttl seconds."""
+  # pages carry the flashed messages of the layout, never cache those, nor
+  # pages without a version to check the cached copy against
+  if session.get('_flashes') or not g.get('page_etag'):
+    return render()[0]
+  page, key = key, f'{key}:{g.page_etag}'
+  html = page_cache.get(key)
+  hit = html is not None
+  if not hit:
+    html, ttl = render()
+    page_cache.set(key, html, ttl, page)
+  response = make_response(html)
+  response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+  return response
+
+def page_ttl(upcoming_shows, now_time):
+  # expire no later than the next show starts, when it moves to "past"
+  ttl = current_app.config['PAGE_CACHE_TTL']
+  if upcoming_shows:
+    ttl = min(ttl, (upcoming_shows[0]['start_time'] - now_time).total_seconds())
+  return ttl
+
+def calendar_response(model, entity_id):
+  """The upcoming shows calendar of a venue or artist, from the feed cache
+  when its ETag (set by @conditional) is unchanged, else streamed."""
+  kind = model.__name__.lower()
+  key = g.page_etag and f'{kind}:{entity_id}:{g.page_etag}'
+  body = feeds.get(key)
+  hit = body is not None
+  if not hit:
+    name = db.session.query(model.name).filter(model.id == entity_id).scalar()
+    if name is None:
+      abort(404)
+    column, other, other_column = show_sides(model)
+    rows = iter_upcoming(column, entity_id, other, datetime.now(),
+                         current_app.config['API_STREAM_CHUNK_SIZE'])
+    body = stream_with_context(feeds.stream(key, calendars.render(kind, name, rows)))
+  response = Response(body, mimetype='text/calendar')
+  response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+  return response
+
+def request_cursor():
+  cursor = request.args.get('cursor')
+  if not cursor:
+    return None
+  try:
+    return decode_cursor(cursor)
+  except ValueError:
+    abort(400)
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
+@main.route('/')
 def index():
   return render_template('pages/home.html')
 
 #  Venues
 #  ----------------------------------------------------------------
-@app.route('/venues')
+@main.route('/venues')
+@conditional(lambda: versions.table_version(Venue))
 def venues():
-  # read data from database
-  now_time = datetime.now().strftime('%Y-%m-%d %H:%S:%M')
-  venues = Venue.query.all()
-  
-  # adding city and state to 'data', avoing replicates
-  data = []
-  venue_loc = set()
-  for venue in venues:
-    venue_loc.add((venue.city, venue.state))
-  for loc in venue_loc:
-    data.append({
-        "city": loc[0],
-        "state": loc[1],
-        "venues": []
-    })
-
-  #loop through venues
-  for venue in venues:
-    # check upcoming shows, comparing the nowtime and show time.
-    print(venue)
-    upcoming_shows = venue.shows.filter(Show.time > now_time).all()
-    # Iterate through the location info in data and append accordingly.
-    for single_loc in data:
-      if venue.state == single_loc['state'] and venue.city == single_loc['city']:
-        single_loc['venues'].append({
-          "id": venue.id,
-          "name":venue.name,
-          "num_upcoming_shows": len(upcoming_shows)
-        })
-
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
+  # upcoming show counts are stored on the venue rows, see counters.py
+  filters = parse_filters(request.args)
+
+  def load_areas():
+    # only run when the area list is not in the fragment cache
+    venues = apply_filters(db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count
+      ), Venue, filters).order_by(Venue.state, Venue.city, Venue.name)
+
+    # group venues by (city, state) in a dict, keeping the query order
+    areas = {}
+    for venue_id, name, city, state, num_upcoming_shows in venues:
+      area = areas.setdefault((city, state), {
+          "city": city,
+          "state": state,
+          "venues": []
+      })
+      area['venues'].append({
+        "id": venue_id,
+        "name": name,
+        "num_upcoming_shows": num_upcoming_shows
+      })
+    return list(areas.values())
+
+  facets = facet_counts(Venue, filters, 'main.venues')
+  return render_template('pages/venues.html', areas=load_areas, facets=facets,
+                         version=g.page_etag)
+
+@main.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
-  search = request.form.get('search_term', '')
-  result = Venue.query.filter(Venue.name.ilike(f'%{search}%'))
+  term = request.form.get('search_term', '')
+  page = max(request.form.get('page', 1, type=int), 1)
+  venues, count = search(term, ('venue',), page)
 
   response = {
-    "count": result.count(),
-    "data": result
+    "count": count,
+    "data": venues,
+    "page": page,
+    "pages": page_count(count, current_app.config['SEARCH_RESULTS_PER_PAGE'])
   }
 
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_venues.html', results=response, search_term=term)
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@conditional(lambda venue_id: versions.entity_version(Venue, venue_id))
 def show_venue(venue_id):
-  data = []
-  A_venue = Venue.query.get(venue_id)
-  venue_shows = db.session.query(Show).join(Artist).filter(Show.venue_id == venue_id).all()
+  return cached_page(f'venue:{venue_id}', lambda: render_venue(venue_id))
 
-  past_shows = []
-  upcoming_shows = []
+def render_venue(venue_id):
+  A_venue = Venue.query.get_or_404(venue_id)
   now_time = datetime.now()
-
-  for show in venue_shows:
-    data = {
-          "artist_id": show.artist_id,
-          "artist_name": show.Artist.name,
-           "artist_image_link": show.Artist.image_link,
-           "start_time": show.time.strftime('%Y-%m-%d %H:%S:%M') 
-        }
-    if show.time > now_time:
-      upcoming_shows.append(data)
-    else:
-      past_shows.append(data)
-
-  data={
-    "id": A_venue.id,
-    "name": A_venue.name,
-    "genres": A_venue.genres,
-    "address": A_venue.address,
-    "city": A_venue.city,
-    "state": A_venue.state,
-    "phone": A_venue.phone,
-    "website": A_venue.website,
-    "facebook_link": A_venue.facebook_link,
-    "seeking_talent": A_venue.seeking_talent,
-    "seeking_description":A_venue.description,
-    "image_link": A_venue.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows)
-  }
+  shows, next_cursors = entity_shows(A_venue, now_time)
+
+  data = venue_dict(A_venue)
+  data.update(shows)
+  data.update({
+    "past_shows_next": next_cursors['past'] and url_for('main.venue_shows', venue_id=venue_id, when='past', cursor=next_cursors['past']),
+    "upcoming_shows_next": next_cursors['upcoming'] and url_for('main.venue_shows', venue_id=venue_id, when='upcoming', cursor=next_cursors['upcoming'])
+  })
   
-  return render_template('pages/show_venue.html', venue=data)
+  html = render_template('pages/show_venue.html', venue=data)
+  return html, page_ttl(shows['upcoming_shows'], now_time)
+
+@main.route('/venues/<int:venue_id>/calendar.ics')
+@conditional(lambda venue_id: versions.entity_version(Venue, venue_id))
+def venue_calendar(venue_id):
+  # upcoming shows for calendar apps, see calendars.py
+  return calendar_response(Venue, venue_id)
+
+@main.route('/venues/<int:venue_id>/shows/<any(upcoming, past):when>')
+def venue_shows(venue_id, when):
+  # next page of a show section, requested by the "Load more" button
+  shows, next_cursor = show_section(Show.venue_id, venue_id, Artist, when,
+                                    datetime.now(), request_cursor())
+  next_url = next_cursor and url_for('main.venue_shows', venue_id=venue_id, when=when, cursor=next_cursor)
+  return render_template('pages/venue_shows.html', shows=shows, next_url=next_url)
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   form = VenueForm()
   try:
@@ -158,8 +254,8 @@ def create_venue_submission():
     db.session.commit()
     # if successful flash success
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
-  except SQLAlchemyError as e:
-    print (e)
+  except SQLAlchemyError:
+    log.exception('Venue %r could not be listed', request.form['name'])
     # roll back is error
     db.session.rollback()
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
@@ -170,113 +266,108 @@ def create_venue_submission():
   return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
+  name = None
   try:
-    # get the venue info
-    To_delvenue = Venue.query.get(venue_id)
-  
-    # delete related shows
-    venue_shows = To_delvenue.shows.all()
-    print (venue_shows)
-    for show in venue_shows:
-      print (show)
-      db.session.delete(show)
-    
-    # Delete the venue 
-    db.session.delete(To_delvenue)
-    
-    # Commit the changes
-    db.session.commit()
-    flash('Venue ' + To_delvenue.name + ' is deleted.')
+    name = db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+    if name is None:
+      abort(404)
+
+    # venues with many shows are deleted by a background job, see jobs.py
+    shows = db.session.query(db.func.count()).filter(Show.venue_id == venue_id).scalar()
+    if shows >= current_app.config['JOB_LARGE_DELETE']:
+      job = runner.enqueue('delete_venue', venue_id=int(venue_id))
+      flash('Venue ' + name + f' is being deleted, see {url_for("main.job_status", job_id=job.id)}.')
+    else:
+      deleted = jobs.delete_entity(Venue, int(venue_id))
+      log.info('Deleted venue %s and %d shows', venue_id, deleted)
+      flash('Venue ' + name + ' is deleted.')
 
-  except SQLAlchemyError as e:
-    print (e)
+  except SQLAlchemyError:
+    log.exception('Venue %s could not be deleted', venue_id)
     db.session.rollback()
-    flash('An error occurred. Venue ' + To_delvenue.name + ' could not be deleted.')
+    flash('An error occurred. Venue ' + str(name) + ' could not be deleted.')
   finally:
     db.session.close()
   
-  return redirect(url_for('venues'))
+  return redirect(url_for('main.venues'))
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
+@conditional(lambda: versions.table_version(Artist))
 def artists():
-  # TODO: replace with real data returned from querying the database
+  filters = parse_filters(request.args)
   data = []
-  artists = Artist.query.all()
+  artists = apply_filters(db.session.query(Artist.id, Artist.name), Artist, filters)
 
-  for A_artist in artists:
+  for artist_id, name in artists:
     data.append({
-      "id" : A_artist.id,
-      "name" : A_artist.name
+      "id" : artist_id,
+      "name" : name
     })
 
-  return render_template('pages/artists.html', artists=data)
+  facets = facet_counts(Artist, filters, 'main.artists')
+  return render_template('pages/artists.html', artists=data, facets=facets)
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
-  search = request.form.get('search_term', '')
-  result = Artist.query.filter(Artist.name.ilike(f'%{search}%'))
+  term = request.form.get('search_term', '')
+  page = max(request.form.get('page', 1, type=int), 1)
+  artists, count = search(term, ('artist',), page)
 
   response = {
-    "count": result.count(),
-    "data": result
+    "count": count,
+    "data": artists,
+    "page": page,
+    "pages": page_count(count, current_app.config['SEARCH_RESULTS_PER_PAGE'])
   }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+  return render_template('pages/search_artists.html', results=response, search_term=term)
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@conditional(lambda artist_id: versions.entity_version(Artist, artist_id))
 def show_artist(artist_id):
-  
-  data = []
-  A_artist = Artist.query.get(artist_id)
-  # Artist_shows = A_artist.shows.all() # alternative to this is below
-  Artist_shows = db.session.query(Show).join(Venue).filter(Show.artist_id == artist_id).all()
-  
-  past_shows = []
-  upcoming_shows = []
-  now_time = datetime.now()
+  return cached_page(f'artist:{artist_id}', lambda: render_artist(artist_id))
 
-  for show in Artist_shows:
-    data = {
-           "venue_id": show.venue_id,
-           "venue_name": show.Venue.name,
-           "venue_image_link": show.Venue.image_link,
-           "start_time": show.time.strftime('%Y-%m-%d %H:%S:%M')
-        }
-    if show.time > now_time:
-      upcoming_shows.append(data)
-    else:
-      past_shows.append(data)
-
-  data={
-    "id": A_artist.id,
-    "name": A_artist.name,
-    "genres": A_artist.genres,
-    "city": A_artist.city,
-    "state": A_artist.state,
-    "phone": A_artist.phone,
-    "facebook_link": A_artist.facebook_link,
-    "seeking_venue": A_artist.seeking_venue,
-    "image_link": A_artist.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows)
-  }
-  print (A_artist.genres)
-
-  return render_template('pages/show_artist.html', artist=data)
+def render_artist(artist_id):
+  A_artist = Artist.query.get_or_404(artist_id)
+  now_time = datetime.now()
+  shows, next_cursors = entity_shows(A_artist, now_time)
+
+  data = artist_dict(A_artist)
+  data.update(shows)
+  data.update({
+    "past_shows_next": next_cursors['past'] and url_for('main.artist_shows', artist_id=artist_id, when='past', cursor=next_cursors['past']),
+    "upcoming_shows_next": next_cursors['upcoming'] and url_for('main.artist_shows', artist_id=artist_id, when='upcoming', cursor=next_cursors['upcoming'])
+  })
+  log.debug('artist %s genres: %s', artist_id, A_artist.genres)
+
+  html = render_template('pages/show_artist.html', artist=data)
+  return html, page_ttl(shows['upcoming_shows'], now_time)
+
+@main.route('/artists/<int:artist_id>/calendar.ics')
+@conditional(lambda artist_id: versions.entity_version(Artist, artist_id))
+def artist_calendar(artist_id):
+  # upcoming shows for calendar apps, see calendars.py
+  return calendar_response(Artist, artist_id)
+
+@main.route('/artists/<int:artist_id>/shows/<any(upcoming, past):when>')
+def artist_shows(artist_id, when):
+  # next page of a show section, requested by the "Load more" button
+  shows, next_cursor = show_section(Show.artist_id, artist_id, Venue, when,
+                                    datetime.now(), request_cursor())
+  next_url = next_cursor and url_for('main.artist_shows', artist_id=artist_id, when=when, cursor=next_cursor)
+  return render_template('pages/artist_shows.html', shows=shows, next_url=next_url)
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   form = ArtistForm()
   A_artist = Artist.query.get(artist_id)
-  print (A_artist.seeking_venue)
-  print (A_artist.genres)
+  log.debug('editing artist %s: seeking_venue=%s genres=%s', artist_id, A_artist.seeking_venue, A_artist.genres)
   
   # the seeking_venue and genres seems cannot pass data to the front end
   # use the following method instead.
@@ -286,7 +377,7 @@ def edit_artist(artist_id):
 
   return render_template('forms/edit_artist.html', form=form, artist=A_artist)
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   # TODO: take values from the form submitted, and update existing
   # artist record with ID <artist_id> using the new attributes
@@ -308,22 +399,21 @@ def edit_artist_submission(artist_id):
     db.session.commit()
     # on successful db edit, flash success
     flash('Artist ' + request.form['name'] + ' was successfully edited!')
-  except SQLAlchemyError as e:
-    print (e)
+  except SQLAlchemyError:
+    log.exception('Artist %s could not be edited', artist_id)
     db.session.rollback()
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be edited.')
   
   finally:
     db.session.close()
   
-  return redirect(url_for('show_artist', artist_id=artist_id))
+  return redirect(url_for('main.show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   form = VenueForm()
   A_venue = Venue.query.get(venue_id)
-  print (A_venue.seeking_talent)
-  print (A_venue.genres)
+  log.debug('editing venue %s: seeking_talent=%s genres=%s', venue_id, A_venue.seeking_talent, A_venue.genres)
   
   # the seeking_venue and genres seems cannot pass data to the front end
   # use the following method instead.
@@ -333,7 +423,7 @@ def edit_venue(venue_id):
 
   return render_template('forms/edit_venue.html', form=form, venue=A_venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   # TODO: take values from the form submitted, and update existing
   # venue record with ID <venue_id> using the new attributes
@@ -356,25 +446,25 @@ def edit_venue_submission(venue_id):
     db.session.commit()
     # on successful db edit, flash success
     flash('Venue ' + request.form['name'] + ' was successfully edited!')
-  except SQLAlchemyError as e:
-    print (e)
+  except SQLAlchemyError:
+    log.exception('Venue %s could not be edited', venue_id)
     db.session.rollback()
     flash('An error occurred. Venue ' + request.form['name'] + ' could not be edited.')
   
   finally:
     db.session.close()
   
-  return redirect(url_for('show_venue', venue_id=venue_id))
+  return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   # called upon submitting the new artist listing form
   # TODO: insert form data as a new Venue record in the db, instead
@@ -398,110 +488,213 @@ def create_artist_submission():
     db.session.commit()
     # on successful db insert, flash success
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
-  except SQLAlchemyError as e:
-    print (e)
+  except SQLAlchemyError:
+    log.exception('Artist %r could not be listed', request.form['name'])
     db.session.rollback()
     flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
   return render_template('pages/home.html')
 
-@app.route('/artists/<artist_id>', methods=['DELETE'])
+@main.route('/artists/<artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
+  name = None
   try:
-    # get the venue info
-    To_delartist = Artist.query.get(artist_id)
-  
-    # delete related shows
-    Artist_shows = To_delartist.shows.all()
-    print(Artist_shows)
-    for show in Artist_shows:
-      print (show)
-      db.session.delete(show)
-    
-    # Delete the venue 
-    db.session.delete(To_delartist)
-    
-    # Commit the changes
-    db.session.commit()
-    flash('Artist ' + To_delartist.name + ' is deleted.')
+    name = db.session.query(Artist.name).filter(Artist.id == artist_id).scalar()
+    if name is None:
+      abort(404)
+
+    # artists with many shows are deleted by a background job, see jobs.py
+    shows = db.session.query(db.func.count()).filter(Show.artist_id == artist_id).scalar()
+    if shows >= current_app.config['JOB_LARGE_DELETE']:
+      job = runner.enqueue('delete_artist', artist_id=int(artist_id))
+      flash('Artist ' + name + f' is being deleted, see {url_for("main.job_status", job_id=job.id)}.')
+    else:
+      deleted = jobs.delete_entity(Artist, int(artist_id))
+      log.info('Deleted artist %s and %d shows', artist_id, deleted)
+      flash('Artist ' + name + ' is deleted.')
 
-  except SQLAlchemyError as e:
-    print (e)
+  except SQLAlchemyError:
+    log.exception('Artist %s could not be deleted', artist_id)
     db.session.rollback()
-    flash('An error occurred. Venue ' + To_delartist.name + ' could not be deleted.')
+    flash('An error occurred. Artist ' + str(name) + ' could not be deleted.')
   finally:
     db.session.close()
   
-  return redirect(url_for('artists'))
+  return redirect(url_for('main.artists'))
 
 
-#  Shows
+#  Jobs
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
-def shows():
-  data = []
-  shows = Show.query.order_by(db.desc(Show.time))
+@main.route('/jobs/<int:job_id>')
+def job_status(job_id):
+  job = db.session.get(Job, job_id)
+  if job is None:
+    return jsonify({"error": f'No job with id {job_id}.'}), 404
+  return jsonify(jsonable(job_dict(job)))
 
-  for A_show in shows:
-    data.append({
-      "venue_id": A_show.venue_id,
-      "venue_name": A_show.Venue.name,
-      "artist_id": A_show.artist_id,
-      "artist_name": A_show.Artist.name,
-      "artist_image_link": A_show.Artist.image_link,
-      "start_time": A_show.time.strftime('%Y-%m-%d %H:%S:%M')
-    })
+#  Search API
+#  ----------------------------------------------------------------
+
+@main.route('/api/search')
+def api_search():
+  # the venues and artists search of the search pages, as JSON
+  term = request.args.get('q', '')
+  kinds = [kind for kind in request.args.getlist('type') if kind in ('venue', 'artist')]
+  page = max(request.args.get('page', 1, type=int), 1)
+  rows, count = search(term, tuple(kinds) or ('venue', 'artist'), page)
+  return jsonify({
+    "query": term,
+    "count": count,
+    "page": page,
+    "pages": page_count(count, current_app.config['SEARCH_RESULTS_PER_PAGE']),
+    "results": [{"type": row.kind, "id": row.id, "name": row.name,
+                 "city": row.city, "state": row.state, "score": row.score} for row in rows]
+  })
+
+#  Suggestions
+#  ----------------------------------------------------------------
+
+@main.route('/api/suggest')
+def suggest():
+  # venue and artist names starting with q, for the search boxes
+  q = request.args.get('q', '').strip()
+  limit = min(max(request.args.get('limit', 0, type=int), 0), 20) or None
+  found = suggestions.lookup(q, limit) if q else {'venue': [], 'artist': []}
+  return jsonify({
+    "query": q,
+    "venues": [{"id": id, "name": name} for id, name in found['venue']],
+    "artists": [{"id": id, "name": name} for id, name in found['artist']]
+  })
 
-  return render_template('pages/shows.html', shows=data)
+#  Shows
+#  ----------------------------------------------------------------
+
+@main.route('/shows')
+@conditional(versions.feed_version)
+def shows():
+  # keyset pagination on (time, id), newest first, see listings.py. The
+  # feed is only queried when the page is not in the fragment cache.
+  cursor = request_cursor()
+  return render_template('pages/shows.html', feed=lambda: show_feed(cursor),
+                         version=g.page_etag)
 
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
   try:
-    new_show = Show(
-      artist_id = request.form['artist_id'],
-      venue_id = request.form['venue_id'],
-      time = request.form['start_time']
+    # checks that the venue and artist exist and are free, see bookings.py
+    rows = bookings.book(
+      int(request.form['venue_id']),
+      int(request.form['artist_id']),
+      [dateutil.parser.parse(request.form['start_time'])],
+      int(request.form['duration']) if request.form.get('duration') else None
     )
-
-    print (request.form['start_time'])
-
-    # commit to database
-    db.session.add(new_show)
     db.session.commit()
+    bookings.invalidate(rows)
 
     # show message
     flash('Show was successfully listed!')
-  except SQLAlchemyError as e:
-    print (e)
+  except bookings.BookingError as e:
+    db.session.rollback()
+    flash(f'Show could not be added. {e}')
+  except (ValueError, OverflowError):
+    db.session.rollback()
+    flash('Show could not be added. Check the artist ID, venue ID, start time and duration.')
+  except SQLAlchemyError:
+    log.exception('Show could not be listed')
     db.session.rollback()
     flash('An error occurred. Show could not be added.')
   
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
+@main.route('/shows/recurring', methods=['POST'])
+def create_recurring_shows():
+  # a residency: the artist at the venue every `every_days` days from
+  # start_time, `count` times or until `until`, booked in one transaction.
+  # Takes a JSON body or form fields and answers in JSON.
+  data = request.get_json(silent=True) or request.form
+  try:
+    starts = bookings.recurring(
+      dateutil.parser.parse(data['start_time']),
+      timedelta(days=int(data.get('every_days', 7))),
+      count=int(data['count']) if data.get('count') else None,
+      until=dateutil.parser.parse(data['until']) if data.get('until') else None
+    )
+    rows = bookings.book(int(data['venue_id']), int(data['artist_id']), starts,
+                         int(data['duration']) if data.get('duration') else None)
+    db.session.commit()
+  except bookings.BookingError as e:
+    db.session.rollback()
+    return jsonify({"error": str(e), "conflicts": jsonable(e.conflicts)}), 409 if e.conflicts else 400
+  except (KeyError, TypeError, ValueError, OverflowError) as e:
+    db.session.rollback()
+    return jsonify({"error": f'Invalid booking: {e}'}), 400
+
+  bookings.invalidate(rows)
+  return jsonify({"created": len(rows), "shows": jsonable(rows)}), 201
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+def create_app(config_name=None):
+  """Build the Fyyur app with the named profile from config.py, or the
+  FYYUR_CONFIG environment variable."""
+  config_name = config_name or os.environ.get('FYYUR_CONFIG', 'development')
+  app = Flask(__name__)
+  app.config.from_object(config.configs[config_name])
+  if not app.config['SECRET_KEY']:
+    raise RuntimeError(f'Set SECRET_KEY in the environment for the {config_name} config.')
+  app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', config.engine_options(app.config))
+
+  logs.init_app(app)
+  moment.init_app(app)
+  replicas.init_app(app)
+  db.init_app(app)
+  migrate.init_app(app, db)
+  page_cache.init_app(app)
+  metrics.init_app(app)
+  suggestions.init_app(app)
+  runner.init_app(app)
+  feeds.init_app(app)
+  assets.init_app(app)
+  fragments.init_app(app)
+  app.jinja_env.filters['datetime'] = format_datetime
+  app.register_blueprint(main)
+  app.register_blueprint(api)
+  register_commands(app)
+  if app.config['TEMPLATE_WARMUP']:
+    warm_templates(app)
+
+  apps.add(app)
+  return app
+
+# A server that imports the app before forking its workers (gunicorn
+# --preload) must not share the parent's pooled connections with them:
+# drop them in every child, which then connects on first use. One hook per
+# process covers every app create_app() made.
+apps = weakref.WeakSet()
+
+def dispose_engines():
+  for app in list(apps):
+    with app.app_context():
+      for engine in db.engines.values():
+        engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork(after_in_child=dispose_engines)
+
+app = create_app()
 
 #----------------------------------------------------------------------------#
 # Launch.
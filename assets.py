@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from flask import request, url_for, send_file, abort
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+# "flask build-assets" copies every file of static/ to ASSETS_BUILD_DIR
+# under a name carrying a hash of its content (css/main.css becomes
+# css/main.1a2b3c4d5e6f.css), with url() references in stylesheets
+# rewritten to the hashed names. Text files are also written gzipped
+# (.gz) and, when the brotli package is installed, brotli compressed
+# (.br). manifest.json maps the original paths to the hashed ones.
+#
+# Templates link assets with asset_url('css/main.css'). With a build it
+# points at /assets/<hashed name>, served precompressed (per the request's
+# Accept-Encoding) and cached for a year as immutable: a changed file gets
+# a new name. Without a build, or for files missing from it, asset_url()
+# falls back to the plain /static URL.
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+compressed_types = ('.css', '.js', '.map', '.svg', '.ttf', '.otf', '.eot', '.json', '.txt')
+css_url = re.compile(r'''url\((['"]?)([^'")]+)\1\)''')
+one_year = 365 * 24 * 3600
+
+def fingerprint(path, content):
+  root, ext = posixpath.splitext(path)
+  return f'{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+def rewrite_css(path, content, manifest):
+  # point url(...) references at the hashed names of the files they name
+  def replace(match):
+    quote, target = match.groups()
+    if re.match(r'^(data:|https?:|//|#)', target):
+      return match.group(0)
+    name, suffix = re.match(r'([^?#]*)(.*)', target).groups()
+    resolved = posixpath.normpath(posixpath.join(posixpath.dirname(path), name))
+    if resolved not in manifest:
+      return match.group(0)
+    hashed = posixpath.relpath(manifest[resolved], posixpath.dirname(path))
+    return f'url({quote}{hashed}{suffix}{quote})'
+  return css_url.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+def write_variants(target, content):
+  with open(target, 'wb') as file:
+    file.write(content)
+  if target.endswith(compressed_types):
+    with open(target + '.gz', 'wb') as file:
+      file.write(gzip.compress(content, 9, mtime=0))
+    if brotli is not None:
+      with open(target + '.br', 'wb') as file:
+        file.write(brotli.compress(content))
+
+def build(static_folder, build_dir):
+  """Fingerprint and compress every file of `static_folder` into
+  `build_dir`. Returns the manifest {path: hashed path}."""
+  paths = []
+  for root, dirs, files in os.walk(static_folder):
+    if os.path.abspath(root).startswith(os.path.abspath(build_dir)):
+      continue
+    for name in files:
+      if name.startswith('.'):
+        continue
+      paths.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+
+  if os.path.isdir(build_dir):
+    shutil.rmtree(build_dir)
+  manifest = {}
+  # stylesheets last, their url()s need the hashed names of the rest
+  for path in sorted(paths, key=lambda path: (path.endswith('.css'), path)):
+    with open(os.path.join(static_folder, path), 'rb') as file:
+      content = file.read()
+    if path.endswith('.css'):
+      content = rewrite_css(path, content, manifest)
+    manifest[path] = fingerprint(path, content)
+    target = os.path.join(build_dir, manifest[path])
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    write_variants(target, content)
+
+  with open(os.path.join(build_dir, 'manifest.json'), 'w') as file:
+    json.dump(manifest, file, indent=2, sort_keys=True)
+  return manifest
+
+class Assets(object):
+
+  def __init__(self, app=None):
+    self.manifest = {}
+    self.build_dir = None
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('ASSETS_BUILD_DIR', os.path.join(app.static_folder, 'build'))
+    self.build_dir = app.config['ASSETS_BUILD_DIR']
+    self.load()
+    app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+    app.jinja_env.globals['asset_url'] = self.url
+    app.extensions['assets'] = self
+
+  def load(self):
+    try:
+      with open(os.path.join(self.build_dir, 'manifest.json')) as file:
+        self.manifest = json.load(file)
+    except FileNotFoundError:
+      self.manifest = {}
+
+  def url(self, path):
+    hashed = self.manifest.get(path)
+    if hashed is None:
+      return url_for('static', filename=path)
+    return url_for('assets', filename=hashed)
+
+  def serve(self, filename):
+    path = os.path.realpath(os.path.join(self.build_dir, filename))
+    if not path.startswith(os.path.realpath(self.build_dir) + os.sep) or not os.path.isfile(path):
+      abort(404)
+
+    encoding = None
+    for name, ext in (('br', '.br'), ('gzip', '.gz')):
+      if name in request.accept_encodings and os.path.isfile(path + ext):
+        encoding, path = name, path + ext
+        break
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(path, mimetype=mimetype, max_age=one_year, conditional=True, etag=True)
+    if encoding:
+      response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+assets = Assets()
@@ -0,0 +1,317 @@
+import time
+from datetime import datetime, timedelta
+import babel.dates
+import dateutil.parser
+
+#----------------------------------------------------------------------------#
+# Benchmarks.
+#----------------------------------------------------------------------------#
+
+def timed(func, values):
+  # seconds per call of func over values
+  start = time.perf_counter()
+  for value in values:
+    func(value)
+  return (time.perf_counter() - start) / len(values)
+
+#  datetime filter
+#  ----------------------------------------------------------------
+
+def legacy_format_datetime(value, format='medium'):
+  # the filter as it was: views strftime'd every show, the filter parsed
+  # the string back and babel re-parsed the pattern and locale per call
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format)
+
+def bench_datetime_filter(shows=100000):
+  """Per-call cost of formatting one show time, before and after."""
+  from app import format_datetime
+
+  start = datetime(2020, 1, 1, 20, 30)
+  times = [start + timedelta(hours=i) for i in range(shows)]
+  return {
+    'before': timed(lambda t: legacy_format_datetime(t.strftime('%Y-%m-%d %H:%M:%S'), 'full'), times),
+    'after': timed(lambda t: format_datetime(t, 'full'), times),
+  }
+
+#  Suggestions
+#  ----------------------------------------------------------------
+
+def suggest_prefixes(count=200, seed=0):
+  # 2-6 letter prefixes of random venue and artist names and name words
+  import random
+  from models import db, Venue, Artist
+  rng = random.Random(seed)
+  names = [name for model in (Venue, Artist)
+           for name, in db.session.query(model.name).order_by(db.func.random()).limit(count)]
+  if not names:
+    raise ValueError('The database has no venues or artists, run "flask seed" first.')
+  prefixes = []
+  for i in range(count):
+    words = rng.choice(names).split()
+    word = ' '.join(words[rng.randrange(min(len(words), 4)):])
+    prefixes.append(word[:rng.randint(2, 6)])
+  return prefixes
+
+def bench_suggest(prefixes):
+  """Seconds per lookup of the in-memory prefix index ('index', built
+  once beforehand) and of the search_names() path the search forms use
+  ('search', one query per model)."""
+  from models import Venue, Artist
+  from search import search_names
+  from suggest import suggestions
+  suggestions.build()
+  start = time.perf_counter()
+  suggestions.build()
+  build = time.perf_counter() - start
+  return {
+    'search': timed(lambda prefix: (search_names(Venue, prefix, 1, 8), search_names(Artist, prefix, 1, 8)), prefixes),
+    'index': timed(lambda prefix: suggestions.lookup(prefix, 8), prefixes),
+    'build': build,
+  }
+
+#  Search
+#  ----------------------------------------------------------------
+
+def legacy_search(model, term):
+  # the original search routes: ILIKE on names, a count() and then the
+  # iteration over the same query
+  result = model.query.filter(model.name.ilike(f'%{term}%'))
+  return result.count(), [row.name for row in result]
+
+def search_terms(count=100, seed=0):
+  # name words, genres, cities and "City, ST" pairs of the catalogue
+  import random
+  from models import db, Venue
+  from search import genres
+  rng = random.Random(seed)
+  rows = db.session.query(Venue.name, Venue.city, Venue.state).order_by(db.func.random()).limit(count).all()
+  if not rows:
+    raise ValueError('The database has no venues, run "flask seed" first.')
+  terms = []
+  for i in range(count):
+    name, city, state = rng.choice(rows)
+    terms.append(rng.choice([
+      rng.choice(name.split()[1:]), rng.choice(list(genres.values())), city, f'{city}, {state}']))
+  return terms
+
+def bench_search(terms):
+  """Seconds per term of the two original search queries (venues and
+  artists, each counted then iterated: 'before') and of one unified
+  search() over both ('after')."""
+  from models import Venue, Artist
+  from search import search
+  return {
+    'before': timed(lambda term: (legacy_search(Venue, term), legacy_search(Artist, term)), terms),
+    'after': timed(lambda term: search(term), terms),
+  }
+
+#  Templates
+#  ----------------------------------------------------------------
+
+def bench_templates(app, rounds=5):
+  """Seconds to load every template of the app as a fresh worker does:
+  compiled from source ('compile') and from a primed bytecode cache
+  ('bytecode')."""
+  import tempfile
+  from jinja2 import FileSystemBytecodeCache
+  from fragments import template_names
+
+  def load_all(bytecode_cache):
+    # an environment without loaded templates, like a restarted worker's
+    env = app.jinja_env.overlay(cache_size=0, bytecode_cache=bytecode_cache)
+    start = time.perf_counter()
+    for name in template_names(env):
+      env.get_template(name)
+    return time.perf_counter() - start
+
+  with tempfile.TemporaryDirectory() as directory:
+    bytecode_cache = FileSystemBytecodeCache(directory)
+    load_all(bytecode_cache)
+    return {
+      'compile': min(load_all(None) for i in range(rounds)),
+      'bytecode': min(load_all(bytecode_cache) for i in range(rounds)),
+      'templates': len(template_names(app.jinja_env)),
+    }
+
+#  Routes
+#  ----------------------------------------------------------------
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def route_requests():
+  """(name, method, path, form) of the benchmarked requests. The detail
+  pages are those of the busiest venue and artist."""
+  from models import db, Venue, Artist, Show
+  busiest = lambda column: db.session.query(column).group_by(column).order_by(
+    db.func.count().desc()).limit(1).scalar()
+  venue_id, artist_id = busiest(Show.venue_id), busiest(Show.artist_id)
+  if venue_id is None or artist_id is None:
+    raise ValueError('The database has no shows, run "flask seed" first.')
+  venue_word = db.session.get(Venue, venue_id).name.split()[1]
+  artist_word = db.session.get(Artist, artist_id).name.split()[1]
+  return [
+    ('venues', 'GET', '/venues', None),
+    ('artists', 'GET', '/artists', None),
+    ('shows', 'GET', '/shows', None),
+    ('show_venue', 'GET', f'/venues/{venue_id}', None),
+    ('show_artist', 'GET', f'/artists/{artist_id}', None),
+    ('search_venues', 'POST', '/venues/search', {'search_term': venue_word}),
+    ('search_artists', 'POST', '/artists/search', {'search_term': artist_word}),
+  ]
+
+def bench_routes(app, iterations=50, cache=False):
+  """Drive every benchmarked route through the test client. Returns
+  {name: {p50_ms, p95_ms, queries, peak_kb}}; peak_kb is the peak Python
+  memory allocated by one request."""
+  import tracemalloc
+  from sqlalchemy import event
+  from sqlalchemy.engine import Engine
+  from cache import page_cache
+  from fragments import fragments
+
+  with app.app_context():
+    requests = route_requests()
+  client = app.test_client()
+  queries = [0]
+  def count(*args):
+    queries[0] += 1
+
+  results = {}
+  event.listen(Engine, 'before_cursor_execute', count)
+  try:
+    for name, method, path, data in requests:
+      def run():
+        if not cache:
+          page_cache.backend.clear()
+          fragments.clear()
+        response = client.open(path, method=method, data=data)
+        if response.status_code != 200:
+          raise ValueError(f'{method} {path} returned {response.status_code}')
+
+      run()  # warm up connections, templates and caches
+      timings = []
+      queries[0] = 0
+      for i in range(iterations):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+      per_request = queries[0] / iterations
+
+      tracemalloc.start()
+      run()
+      peak = tracemalloc.get_traced_memory()[1]
+      tracemalloc.stop()
+
+      results[name] = {
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'queries': round(per_request, 2),
+        'peak_kb': round(peak / 1024, 1),
+      }
+  finally:
+    event.remove(Engine, 'before_cursor_execute', count)
+  return results
+
+#  Logging
+#  ----------------------------------------------------------------
+
+bench_venue_name = 'Logging benchmark venue'
+
+def bench_logging(app, threads=8, requests=25, write_delay=0.0):
+  """p50/p95 latency of GET /venues and DELETE /venues/<id> from
+  `threads` concurrent clients, with log records written on the request
+  threads ('sync') and through the queue ('queue'). Every DEBUG record is
+  kept, so each request logs at least its request line. write_delay adds
+  that many seconds to each write, like a slow disk or network share. The
+  deletes only remove venues made for the benchmark."""
+  import logging
+  import os
+  import tempfile
+  from concurrent.futures import ThreadPoolExecutor
+  from models import db, Venue
+  from logs import logs, output_handler, JSONFormatter
+
+  class SlowFileHandler(logging.FileHandler):
+    def emit(self, record):
+      time.sleep(write_delay)
+      super().emit(record)
+
+  def client_run(ids):
+    client = app.test_client()
+    timings = {'venues': [], 'delete': []}
+    for venue_id in ids:
+      for name, method, path in (('venues', 'GET', '/venues'),
+                                 ('delete', 'DELETE', f'/venues/{venue_id}')):
+        start = time.perf_counter()
+        response = client.open(path, method=method)
+        timings[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+          raise ValueError(f'{method} {path} returned {response.status_code}')
+    return timings
+
+  sample_rates = app.config['LOG_SAMPLE_RATES']
+  levels = [(logger, logger.level) for logger in logs.loggers]
+  app.config['LOG_SAMPLE_RATES'] = {}
+  for logger, level in levels:
+    logger.setLevel(logging.DEBUG)
+
+  results = {}
+  try:
+    with tempfile.TemporaryDirectory() as directory:
+      for mode in ('sync', 'queue'):
+        with app.app_context():
+          venues = [Venue(name=bench_venue_name, city='Benchmark', state='CA', genres=['Other'])
+                    for i in range(threads * requests)]
+          db.session.add_all(venues)
+          db.session.commit()
+          ids = [venue.id for venue in venues]
+          db.session.remove()
+
+        handler = SlowFileHandler(os.path.join(directory, f'{mode}.log'))
+        handler.setFormatter(JSONFormatter())
+        logs.install(app, [handler], queued=mode == 'queue')
+        with ThreadPoolExecutor(threads) as pool:
+          runs = list(pool.map(client_run, [ids[i::threads] for i in range(threads)]))
+        logs.stop()
+        handler.close()
+
+        results[mode] = {}
+        for name in ('venues', 'delete'):
+          timings = [seconds for run in runs for seconds in run[name]]
+          results[mode][name] = {
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+          }
+  finally:
+    app.config['LOG_SAMPLE_RATES'] = sample_rates
+    for logger, level in levels:
+      logger.setLevel(level)
+    logs.install(app, [output_handler(app.config['LOG_FILE'])])
+    with app.app_context():
+      # venues left over by a failed run
+      db.session.query(Venue).filter(Venue.name == bench_venue_name).delete(synchronize_session=False)
+      db.session.commit()
+  return results
+
+def compare(results, baseline, tolerance=0.2):
+  """Lines comparing results against a saved baseline, and the names of
+  the routes whose p95 latency or query count grew more than tolerance."""
+  lines, regressions = [], []
+  for name, result in results.items():
+    before = baseline.get(name)
+    if before is None:
+      lines.append(f'{name:15} new')
+      continue
+    change = result['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+    lines.append(f'{name:15} p95 {before["p95_ms"]:8.2f} -> {result["p95_ms"]:8.2f} ms ({change:+.0%})'
+                 f'  queries {before["queries"]:g} -> {result["queries"]:g}')
+    if change > tolerance or result['queries'] > before['queries']:
+      regressions.append(name)
+  return lines, regressions
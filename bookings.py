@@ -0,0 +1,137 @@
+import bisect
+from datetime import timedelta
+from flask import current_app
+from models import db, Venue, Artist, Show
+from cache import page_cache
+import counters
+
+#----------------------------------------------------------------------------#
+# Bookings.
+#----------------------------------------------------------------------------#
+# A show occupies its venue and its artist for `duration` minutes from its
+# start, and two shows of the same venue or artist may not overlap. No show
+# is longer than SHOW_MAX_DURATION, so the shows that can overlap
+# [start, end) all start in (start - SHOW_MAX_DURATION, end): a range scan
+# of the (venue_id, time) and (artist_id, time) indexes, however many
+# shows the venue or artist has.
+#
+# book() first locks the venue and artist rows (SELECT ... FOR UPDATE on
+# postgres), which also checks that both exist, so two bookings of the
+# same venue or artist cannot both pass the check. A series of dates, like
+# a weekly residency, is checked against one scan per side spanning the
+# whole series and inserted with one executemany.
+#
+# Shows loaded by "flask seed" and "flask import" are not checked.
+#
+# Show times are naive local times, compared with datetime.now(). Times
+# given with a UTC offset are converted to the server's time zone first.
+
+class BookingError(ValueError):
+  """A booking that cannot be made. `conflicts` are the show dicts of
+  the existing shows it overlaps."""
+
+  def __init__(self, message, conflicts=()):
+    super().__init__(message)
+    self.conflicts = list(conflicts)
+
+def wall_clock(value):
+  # a time with a UTC offset as the naive local time shows are stored in
+  if value is not None and value.tzinfo is not None:
+    value = value.astimezone().replace(tzinfo=None)
+  return value
+
+def recurring(first, every, count=None, until=None):
+  """Start times from `first`, `every` (a timedelta) apart: `count` of
+  them, or all those up to and including `until`."""
+  if count is None and until is None:
+    raise BookingError('Give a number of dates or an end date.')
+  if every <= timedelta(0):
+    raise BookingError('The dates of a series must follow each other.')
+  limit = current_app.config['SHOW_MAX_RECURRING']
+  first, until = wall_clock(first), wall_clock(until)
+  starts = []
+  start = first
+  while (count is None or len(starts) < count) and (until is None or start <= until):
+    if len(starts) == limit:
+      raise BookingError(f'A series can book at most {limit} dates.')
+    starts.append(start)
+    start += every
+  return starts
+
+def lock(venue_id, artist_id):
+  # venue first, then artist, in every booking: no lock order deadlocks
+  for model, id in ((Venue, venue_id), (Artist, artist_id)):
+    found = db.session.query(model.id).filter(model.id == id).with_for_update().scalar()
+    if found is None:
+      raise BookingError(f'No {model.__name__.lower()} with id {id}.')
+
+def nearby_shows(venue_id, artist_id, start, end):
+  """The shows of the venue or the artist that can overlap [start, end),
+  in one UNION ALL of two index range scans."""
+  earliest = start - timedelta(minutes=current_app.config['SHOW_MAX_DURATION'])
+  def side(column, id):
+    return db.select(Show.id, Show.venue_id, Show.artist_id, Show.time, Show.duration).where(
+      column == id, Show.time > earliest, Show.time < end)
+  rows = db.session.execute(db.union_all(side(Show.venue_id, venue_id),
+                                         side(Show.artist_id, artist_id)))
+  # a show of both the venue and the artist comes back from both sides
+  return list({row.id: row for row in rows}.values())
+
+def conflicts(slots, shows):
+  """The shows overlapping any of `slots`, sorted (start, end) pairs that
+  do not overlap each other: their ends are then sorted too, and the last
+  slot starting before a show ends is the only one that can reach it."""
+  starts = [start for start, end in slots]
+  clashes = []
+  for show in shows:
+    show_end = show.time + timedelta(minutes=show.duration)
+    i = bisect.bisect_left(starts, show_end)
+    if i and slots[i - 1][1] > show.time:
+      clashes.append(show)
+  return sorted(clashes, key=lambda show: show.time)
+
+def book(venue_id, artist_id, starts, duration=None):
+  """Book the artist at the venue at each of `starts` for `duration`
+  minutes (SHOW_DEFAULT_DURATION). Raises BookingError, and inserts
+  nothing, when the venue or artist does not exist, the duration is out
+  of range or any date overlaps. Returns the inserted rows; the caller
+  commits and then calls invalidate()."""
+  duration = duration or current_app.config['SHOW_DEFAULT_DURATION']
+  if not 0 < duration <= current_app.config['SHOW_MAX_DURATION']:
+    raise BookingError(f'A show lasts 1 to {current_app.config["SHOW_MAX_DURATION"]} minutes.')
+  length = timedelta(minutes=duration)
+  starts = [wall_clock(start) for start in starts]
+  slots = sorted((start, start + length) for start in starts)
+  if not slots:
+    raise BookingError('No dates to book.')
+  for (start, end), (next_start, next_end) in zip(slots, slots[1:]):
+    if next_start < end:
+      raise BookingError(f'The dates {start} and {next_start} overlap.')
+
+  lock(venue_id, artist_id)
+  clashes = conflicts(slots, nearby_shows(venue_id, artist_id, slots[0][0], slots[-1][1]))
+  if clashes:
+    first = clashes[0]
+    with_whom = 'the venue' if first.venue_id == venue_id else 'the artist'
+    raise BookingError(f'{len(clashes)} other show(s) overlap the booking, the first one of '
+                       f'{with_whom} at {first.time}.', [show_row(show) for show in clashes])
+
+  rows = [{'venue_id': venue_id, 'artist_id': artist_id, 'time': start, 'duration': duration}
+          for start, end in slots]
+  db.session.execute(Show.__table__.insert(), rows)
+  counters.add_shows(rows)
+  return rows
+
+def invalidate(rows):
+  # executemany inserts skip the ORM events the page cache listens to
+  page_cache.invalidate(*{f'venue:{row["venue_id"]}' for row in rows},
+                        *{f'artist:{row["artist_id"]}' for row in rows})
+
+def show_row(show):
+  return {
+    "id": show.id,
+    "venue_id": show.venue_id,
+    "artist_id": show.artist_id,
+    "start_time": show.time,
+    "end_time": show.time + timedelta(minutes=show.duration)
+  }
@@ -0,0 +1,243 @@
+import csv
+import io
+import json
+import logging
+import time
+from datetime import datetime
+from itertools import islice
+from models import db, Venue, Artist, Show
+import counters
+import bookings
+
+#----------------------------------------------------------------------------#
+# Bulk import / export.
+#----------------------------------------------------------------------------#
+# Files are CSV with a header row or NDJSON (one JSON object per line), with
+# the model's column names as fields. In CSV, genres are separated by '|'.
+# Shows reference their artist and venue either by artist_id/venue_id or by
+# artist/venue name.
+#
+# Rows keep the id they have in the file, so an export imported into an
+# empty database keeps the references of its shows; rows without an id get
+# a new one. Importing an id that is already taken fails.
+#
+# Rows whose values do not convert (an id that is not a number, a time that
+# is not ISO 8601, an NDJSON line that is not an object) are skipped and
+# logged with their row number, like shows whose artist or venue does not
+# exist, so earlier chunks are never left half imported by a traceback.
+#
+# Rows are streamed in chunks of `chunk_size`: every chunk is inserted with
+# one executemany (or a COPY for shows on postgres) and committed, so memory
+# use does not depend on the size of the file.
+
+columns = {
+  'venues': ['id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'image_link',
+             'facebook_link', 'website', 'seeking_talent', 'description'],
+  'artists': ['id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+              'facebook_link', 'website', 'seeking_venue', 'seeking_description'],
+  'shows': ['id', 'artist_id', 'venue_id', 'time', 'duration'],
+}
+models = {'venues': Venue, 'artists': Artist, 'shows': Show}
+
+log = logging.getLogger('fyyur.bulk')
+
+def read_rows(file, format):
+  if format == 'csv':
+    for row in csv.DictReader(file):
+      yield {key: (value if value != '' else None) for key, value in row.items()}
+  else:
+    for line in file:
+      if line.strip():
+        try:
+          yield json.loads(line)
+        except ValueError:
+          # skipped as a bad row by typed_rows()
+          yield None
+
+def chunks(rows, size):
+  rows = iter(rows)
+  while True:
+    chunk = list(islice(rows, size))
+    if not chunk:
+      return
+    yield chunk
+
+def convert(kind, row):
+  """Column values of one input row, typed for the model."""
+  table = models[kind].__table__
+  values = {}
+  for column in columns[kind]:
+    value = row.get(column)
+    if column == 'id':
+      if value is not None:
+        values['id'] = int(value)
+      continue
+    if value is None:
+      # every row of an executemany needs the same keys, use the default
+      default = table.c[column].default
+      if not (column == 'time' or (default is not None and default.is_callable)):
+        values[column] = default.arg if default is not None else None
+      continue
+    if column == 'genres' and isinstance(value, str):
+      value = [genre for genre in value.split('|') if genre]
+    elif column in ('seeking_talent', 'seeking_venue') and isinstance(value, str):
+      value = value.strip().lower() in ('1', 'true', 'yes', 'y')
+    elif column == 'time' and isinstance(value, str):
+      value = bookings.wall_clock(datetime.fromisoformat(value))
+    elif column in ('artist_id', 'venue_id', 'duration'):
+      value = int(value)
+    values[column] = value
+  return values
+
+def typed_rows(kind, chunk, first):
+  """convert() of each row of a chunk whose rows are numbered from
+  `first`. Rows that do not convert are logged and left out."""
+  typed = []
+  for number, row in enumerate(chunk, first):
+    try:
+      if not isinstance(row, dict):
+        raise ValueError('not a JSON object')
+      typed.append(convert(kind, row))
+    except (ValueError, TypeError, OverflowError) as e:
+      log.warning('%s row %d skipped: %s', kind, number, e)
+  return typed
+
+#  Import
+#  ----------------------------------------------------------------
+
+def resolve_names(model, names):
+  # {name: id} for all names in one IN query
+  if not names:
+    return {}
+  rows = db.session.query(model.name, db.func.min(model.id)).filter(
+    model.name.in_(names)).group_by(model.name)
+  return dict(rows)
+
+def resolve_shows(chunk, first):
+  """Typed show rows of a chunk numbered from `first`, with artist/venue
+  names resolved to ids. Returns (rows, skipped)."""
+  named = [row for row in chunk if isinstance(row, dict)]
+  artists = resolve_names(Artist, {row['artist'] for row in named if not row.get('artist_id') and row.get('artist')})
+  venues = resolve_names(Venue, {row['venue'] for row in named if not row.get('venue_id') and row.get('venue')})
+  rows = []
+  for row in chunk:
+    if isinstance(row, dict):
+      row = dict(row)
+      if not row.get('artist_id'):
+        row['artist_id'] = artists.get(row.get('artist'))
+      if not row.get('venue_id'):
+        row['venue_id'] = venues.get(row.get('venue'))
+    rows.append(row)
+  typed = typed_rows('shows', rows, first)
+
+  # ids given in the file must exist too
+  artist_ids = {values['artist_id'] for values in typed if values['artist_id'] is not None}
+  venue_ids = {values['venue_id'] for values in typed if values['venue_id'] is not None}
+  known_artists = {id for id, in db.session.query(Artist.id).filter(Artist.id.in_(artist_ids))}
+  known_venues = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))}
+
+  shows = [values for values in typed
+           if values['artist_id'] in known_artists and values['venue_id'] in known_venues and 'time' in values]
+  return shows, len(chunk) - len(shows)
+
+def copy_shows(shows):
+  # postgres COPY through psycopg2, much faster than INSERT for big chunks
+  names = list(shows[0])
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  for show in shows:
+    writer.writerow([export_value(show[name], 'csv') for name in names])
+  buffer.seek(0)
+  cursor = db.session.connection().connection.cursor()
+  cursor.copy_expert(f'COPY "Show" ({", ".join(names)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+def insert_rows(model, rows, use_copy=False):
+  # every row of an executemany (or COPY) needs the same keys: rows with
+  # and without an id go in separately
+  for group in ([row for row in rows if 'id' in row], [row for row in rows if 'id' not in row]):
+    if not group:
+      continue
+    if use_copy:
+      copy_shows(group)
+    else:
+      db.session.execute(model.__table__.insert(), group)
+
+def reset_sequence(model):
+  # rows inserted with their ids leave a postgres id sequence behind them
+  if db.session.get_bind().dialect.name == 'postgresql':
+    table = model.__tablename__
+    db.session.execute(db.text(
+      f"""SELECT setval(pg_get_serial_sequence('"{table}"', 'id'), """
+      f'COALESCE((SELECT MAX(id) FROM "{table}"), 0) + 1, false)'))
+
+def can_copy():
+  if db.session.get_bind().dialect.name != 'postgresql':
+    return False
+  return hasattr(db.session.connection().connection.cursor(), 'copy_expert')
+
+def import_rows(kind, file, format='csv', chunk_size=5000, progress=None):
+  """Insert the rows of `file` into the `kind` table. Calls
+  progress(inserted, skipped, seconds) after every chunk and returns the
+  final (inserted, skipped, seconds)."""
+  model = models[kind]
+  use_copy = kind == 'shows' and can_copy()
+  inserted = skipped = 0
+  kept_ids = False
+  start = time.perf_counter()
+
+  for chunk in chunks(read_rows(file, format), chunk_size):
+    first = inserted + skipped + 1
+    if kind == 'shows':
+      rows, chunk_skipped = resolve_shows(chunk, first)
+    else:
+      rows = typed_rows(kind, chunk, first)
+      chunk_skipped = len(chunk) - len(rows)
+    skipped += chunk_skipped
+
+    if rows:
+      insert_rows(model, rows, use_copy)
+      kept_ids = kept_ids or any('id' in row for row in rows)
+      if kind == 'shows':
+        counters.add_shows(rows)
+    db.session.commit()
+    inserted += len(rows)
+    if kind == 'shows':
+      bookings.invalidate(rows)
+    if progress:
+      progress(inserted, skipped, time.perf_counter() - start)
+
+  if kept_ids:
+    reset_sequence(model)
+    db.session.commit()
+  return inserted, skipped, time.perf_counter() - start
+
+#  Export
+#  ----------------------------------------------------------------
+
+def export_value(value, format):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  if format == 'csv' and isinstance(value, list):
+    return '|'.join(value)
+  return value
+
+def export_rows(kind, file, format='csv', chunk_size=5000):
+  """Write every `kind` row to `file`, streaming `chunk_size` rows at a
+  time from a server-side cursor. Returns the number of rows written."""
+  model = models[kind]
+  names = columns[kind]
+  query = db.session.query(*[getattr(model, name) for name in names]).order_by(model.id)
+  query = query.execution_options(stream_results=True).yield_per(chunk_size)
+
+  if format == 'csv':
+    writer = csv.writer(file)
+    writer.writerow(names)
+  count = 0
+  for row in query:
+    values = [export_value(value, format) for value in row]
+    if format == 'csv':
+      writer.writerow(values)
+    else:
+      file.write(json.dumps(dict(zip(names, values))) + '\n')
+    count += 1
+  return count
@@ -0,0 +1,251 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+# Rendered venue and artist pages are cached under keys like 'venue:3:<etag>',
+# the page key 'venue:3' followed by the page version of versions.py, which
+# is read from the database on every request. A page changed by another
+# process, or read from a lagging replica, is then never served under a
+# newer version. When a commit touches a venue/artist or one of its shows,
+# every cached version of the page is dropped too, see PageCache.listen().
+# The backends keep the cached versions of each page in a set for that.
+
+
+class LRUCache(object):
+  """In-process cache bounded to `maxsize` entries, each living at most
+  `ttl` seconds. Least recently used entries are evicted first."""
+
+  def __init__(self, maxsize=512, ttl=300):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        return None
+      value, expires = entry
+      if expires <= time.monotonic():
+        del self.entries[key]
+        return None
+      self.entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl=None):
+    expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+    with self.lock:
+      self.entries[key] = (value, expires)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.maxsize:
+        self.entries.popitem(last=False)
+
+  def delete(self, *keys):
+    with self.lock:
+      for key in keys:
+        self.entries.pop(key, None)
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+
+class LocalPages(object):
+  """Page cache in this process: an LRUCache, and the keys of the cached
+  versions of each page."""
+
+  def __init__(self, maxsize=512, ttl=300):
+    self.cache = LRUCache(maxsize, ttl)
+    self.versions = {}
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    return self.cache.get(key)
+
+  def set(self, key, value, ttl=None, page=None):
+    self.cache.set(key, value, ttl)
+    if page is not None:
+      with self.lock:
+        # forget the versions evicted since
+        keys = {known for known in self.versions.get(page, ()) if known in self.cache.entries}
+        keys.add(key)
+        self.versions[page] = keys
+
+  def delete_pages(self, *pages):
+    with self.lock:
+      keys = [key for page in pages for key in self.versions.pop(page, ())]
+    self.cache.delete(*keys)
+
+  def clear(self):
+    self.cache.clear()
+    with self.lock:
+      self.versions.clear()
+
+class SharedCache(object):
+  """Cache shared between worker processes, stored through a redis-style
+  client (get, set with ex=, delete)."""
+
+  def __init__(self, client, ttl=300, prefix='fyyur:page:'):
+    self.client = client
+    self.ttl = ttl
+    self.prefix = prefix
+
+  def get(self, key):
+    value = self.client.get(self.prefix + key)
+    return value.decode() if isinstance(value, bytes) else value
+
+  def set(self, key, value, ttl=None, page=None):
+    ex = max(int(self.ttl if ttl is None else ttl), 1)
+    self.client.set(self.prefix + key, value, ex=ex)
+    if page is not None:
+      # a set of the page's cached versions, living as long as the newest
+      versions = self.prefix + page + ':versions'
+      self.client.sadd(versions, key)
+      self.client.expire(versions, ex)
+
+  def delete(self, *keys):
+    if keys:
+      self.client.delete(*[self.prefix + key for key in keys])
+
+  def delete_pages(self, *pages):
+    for page in pages:
+      versions = self.prefix + page + ':versions'
+      keys = [key.decode() if isinstance(key, bytes) else key for key in self.client.smembers(versions)]
+      self.client.delete(versions, *[self.prefix + key for key in keys])
+
+  def clear(self):
+    keys = list(self.client.scan_iter(self.prefix + '*'))
+    if keys:
+      self.client.delete(*keys)
+
+class LocalClient(object):
+  """Local stand-in for a redis client, for running SharedCache without a
+  redis server."""
+
+  def __init__(self):
+    self.cache = LRUCache(maxsize=float('inf'))
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    return self.cache.get(key)
+
+  def set(self, key, value, ex=None):
+    self.cache.set(key, value, ttl=ex if ex is not None else float('inf'))
+
+  def delete(self, *keys):
+    self.cache.delete(*keys)
+
+  def sadd(self, name, *values):
+    with self.lock:
+      members = self.cache.get(name) or set()
+      members.update(values)
+      self.cache.set(name, members, ttl=float('inf'))
+
+  def smembers(self, name):
+    return set(self.cache.get(name) or ())
+
+  def expire(self, name, seconds):
+    with self.lock:
+      value = self.cache.get(name)
+      if value is not None:
+        self.cache.set(name, value, ttl=seconds)
+
+  def scan_iter(self, match):
+    prefix = match.rstrip('*')
+    return [key for key in list(self.cache.entries) if key.startswith(prefix)]
+
+class PageCache(object):
+  """Front for a cache backend that counts hits and misses and invalidates
+  pages from SQLAlchemy session commits."""
+
+  def __init__(self, app=None):
+    self.backend = None
+    self.hits = 0
+    self.misses = 0
+    self.lock = threading.Lock()
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    ttl = app.config['PAGE_CACHE_TTL']
+    if app.config.get('PAGE_CACHE_REDIS_URL'):
+      import redis
+      self.backend = SharedCache(redis.Redis.from_url(app.config['PAGE_CACHE_REDIS_URL']), ttl)
+    else:
+      self.backend = LocalPages(app.config['PAGE_CACHE_SIZE'], ttl)
+    app.extensions['page_cache'] = self
+
+  def get(self, key):
+    value = self.backend.get(key)
+    with self.lock:
+      if value is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+    return value
+
+  def set(self, key, value, ttl=None, page=None):
+    # `page` ('venue:3') is the page `key` is a version of
+    self.backend.set(key, value, ttl, page)
+
+  def invalidate(self, *pages):
+    # every cached version of the pages
+    if pages:
+      self.backend.delete_pages(*pages)
+
+  def stats(self):
+    with self.lock:
+      return {'hits': self.hits, 'misses': self.misses}
+
+  #  Invalidation
+  #  ----------------------------------------------------------------
+
+  def listen(self, session, Venue, Artist, Show):
+    """Collect the page keys touched by each flush and invalidate them once
+    the transaction commits."""
+
+    def pending(sess):
+      return sess.info.setdefault('page_cache_keys', set())
+
+    @event.listens_for(session, 'before_flush')
+    def collect(sess, flush_context, instances):
+      keys = pending(sess)
+      retitled = {Venue: [], Artist: []}
+      for obj in list(sess.new) + list(sess.dirty) + list(sess.deleted):
+        if isinstance(obj, Show):
+          keys.add(f'venue:{obj.venue_id}')
+          keys.add(f'artist:{obj.artist_id}')
+          # a show moved to another venue or artist leaves the old page too
+          for attr in ('venue_id', 'artist_id'):
+            for old in inspect(obj).attrs[attr].history.deleted:
+              keys.add(f'{attr[:-3]}:{old}')
+        elif isinstance(obj, (Venue, Artist)) and obj.id is not None:
+          keys.add(f'{type(obj).__name__.lower()}:{obj.id}')
+          attrs = inspect(obj).attrs
+          if attrs.name.history.has_changes() or attrs.image_link.history.has_changes():
+            retitled[type(obj)].append(obj.id)
+
+      # show tiles carry the name and image of the venue (on artist pages)
+      # or of the artist (on venue pages)
+      if retitled[Venue]:
+        artist_ids = sess.query(Show.artist_id).filter(Show.venue_id.in_(retitled[Venue])).distinct()
+        keys.update(f'artist:{artist_id}' for artist_id, in artist_ids)
+      if retitled[Artist]:
+        venue_ids = sess.query(Show.venue_id).filter(Show.artist_id.in_(retitled[Artist])).distinct()
+        keys.update(f'venue:{venue_id}' for venue_id, in venue_ids)
+
+    @event.listens_for(session, 'after_commit')
+    def invalidate(sess):
+      keys = sess.info.pop('page_cache_keys', None)
+      if keys:
+        self.invalidate(*keys)
+
+    @event.listens_for(session, 'after_soft_rollback')
+    def discard(sess, previous_transaction):
+      sess.info.pop('page_cache_keys', None)
+
+page_cache = PageCache()
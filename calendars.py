@@ -0,0 +1,107 @@
+from datetime import timedelta
+from flask import request, url_for
+from cache import LRUCache
+
+#----------------------------------------------------------------------------#
+# iCalendar feeds.
+#----------------------------------------------------------------------------#
+# /venues/<id>/calendar.ics and /artists/<id>/calendar.ics list the upcoming
+# shows of a venue or artist as iCalendar (RFC 5545) events, written while
+# the rows are read from the (venue_id|artist_id, time) index. The feeds
+# share the ETag of their venue/artist page (see versions.py), so polling
+# calendar clients get a 304 after one small query. A feed body is kept
+# in a small in-process cache under that ETag: other clients polling an
+# unchanged feed get the stored body without any show query.
+
+def escape(text):
+  # TEXT values escape backslashes, semicolons, commas and newlines
+  return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def fold(line):
+  """Content lines longer than 75 octets continue on lines starting with
+  a space, split between characters."""
+  encoded = line.encode('utf-8')
+  if len(encoded) <= 75:
+    return line + '\r\n'
+  parts, current, size = [], '', 0
+  for char in line:
+    width = len(char.encode('utf-8'))
+    if size + width > (75 if not parts else 74):
+      parts.append(current)
+      current, size = '', 0
+    current += char
+    size += width
+  parts.append(current)
+  return '\r\n '.join(parts) + '\r\n'
+
+def ics_time(value):
+  # show times are local wall clock times, "floating" in iCalendar
+  return value.strftime('%Y%m%dT%H%M%S')
+
+def header(name):
+  return ''.join(fold(line) for line in (
+    'BEGIN:VCALENDAR',
+    'VERSION:2.0',
+    'PRODID:-//Fyyur//Upcoming shows//EN',
+    'CALSCALE:GREGORIAN',
+    f'X-WR-CALNAME:{escape(name)}',
+  ))
+
+footer = 'END:VCALENDAR\r\n'
+
+def event(show_id, start, duration, updated_at, summary, url):
+  return ''.join(fold(line) for line in (
+    'BEGIN:VEVENT',
+    f'UID:show-{show_id}@{request.host}',
+    f'DTSTAMP:{ics_time(updated_at or start)}Z',
+    f'DTSTART:{ics_time(start)}',
+    f'DTEND:{ics_time(start + timedelta(minutes=duration))}',
+    f'SUMMARY:{escape(summary)}',
+    f'URL:{url}',
+    'END:VEVENT',
+  ))
+
+def render(kind, name, rows, chunk_size=100):
+  """Yield the calendar of a venue (kind 'venue') or artist named `name`,
+  `chunk_size` events at a time, from rows of (show id, time, duration,
+  updated_at, other id, other name)."""
+  yield header(name)
+  other_kind = 'artist' if kind == 'venue' else 'venue'
+  events = []
+  for show_id, time, duration, updated_at, other_id, other_name in rows:
+    summary = f'{other_name} at {name}' if kind == 'venue' else f'{name} at {other_name}'
+    url = url_for(f'main.show_{other_kind}', **{f'{other_kind}_id': other_id}, _external=True)
+    events.append(event(show_id, time, duration, updated_at, summary, url))
+    if len(events) == chunk_size:
+      yield ''.join(events)
+      events = []
+  yield ''.join(events) + footer
+
+class FeedCache(object):
+  """Calendar bodies by venue/artist and ETag, see above."""
+
+  def __init__(self, app=None):
+    self.cache = None
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('ICAL_CACHE_SIZE', 256)
+    app.config.setdefault('ICAL_CACHE_TTL', 300)
+    self.cache = LRUCache(app.config['ICAL_CACHE_SIZE'], app.config['ICAL_CACHE_TTL'])
+    app.extensions['calendars'] = self
+
+  def get(self, key):
+    return self.cache.get(key) if key is not None else None
+
+  def stream(self, key, chunks):
+    """Yield `chunks` and store their concatenation under `key` once all
+    of them were sent. A None key is not stored."""
+    body = []
+    for chunk in chunks:
+      body.append(chunk)
+      yield chunk
+    if key is not None:
+      self.cache.set(key, ''.join(body))
+
+feeds = FeedCache()
@@ -0,0 +1,331 @@
+import json
+import time
+from datetime import timedelta
+import re
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from models import db, Venue, Artist, Show, Job
+import seed as sample_data
+import bench
+import bulk
+import assets
+from cache import page_cache
+from fragments import fragments
+import counters
+import bookings
+from jobs import runner
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@click.command('seed')
+@click.option('--venues', default=10)
+@click.option('--artists', default=10)
+@click.option('--shows', default=100)
+@click.option('--seed', 'random_seed', default=0, help='Same seed, same data.')
+@click.option('--past-fraction', default=0.7, help='Share of shows in the past.')
+@with_appcontext
+def seed_command(venues, artists, shows, random_seed, past_fraction):
+  """Insert generated venues, artists and shows."""
+  sample_data.seed(venues, artists, shows, random_seed, past_fraction)
+  click.echo(f'Added {venues} venues, {artists} artists and {shows} shows.')
+
+@click.command('recount-shows')
+@click.option('--all', 'everything', is_flag=True,
+              help='Recount every venue and artist, not just those with a past next show.')
+@with_appcontext
+def recount_shows_command(everything):
+  """Move started shows from upcoming to past in the show counters. Run it
+  every few minutes, e.g. from cron."""
+  if everything:
+    updated = {model.__name__: counters.recount(model) for model in (Venue, Artist)}
+  else:
+    updated = counters.roll_over()
+  db.session.commit()
+  click.echo(f'Recounted {updated["Venue"]} venues and {updated["Artist"]} artists.')
+
+@click.command('resume-jobs')
+@with_appcontext
+def resume_jobs_command():
+  """Run the jobs left queued or running by stopped app processes, here
+  and one at a time. Only run it while no app process is working on them."""
+  app = current_app._get_current_object()
+  job_ids = [job_id for job_id, in db.session.query(Job.id).filter(
+    Job.status.in_(('queued', 'running'))).order_by(Job.id)]
+  for job_id in job_ids:
+    status = runner.run(app, job_id, resubmit=False)
+    while status == 'queued':
+      time.sleep(app.config['JOB_RETRY_DELAY'])
+      status = runner.run(app, job_id, resubmit=False)
+    click.echo(f'Job {job_id}: {status}')
+  click.echo(f'Resumed {len(job_ids)} jobs.')
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+  """Fingerprint and precompress static/ for /assets."""
+  build_dir = current_app.config['ASSETS_BUILD_DIR']
+  manifest = assets.build(current_app.static_folder, build_dir)
+  click.echo(f'Built {len(manifest)} assets into {build_dir}' +
+             ('' if assets.brotli else ' (install brotli for .br files)'))
+
+@click.command('book-recurring')
+@click.argument('venue_id', type=int)
+@click.argument('artist_id', type=int)
+@click.argument('start', type=click.DateTime(['%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M']))
+@click.option('--every-days', default=7, help='Days between two shows.')
+@click.option('--count', type=int, help='Number of shows.')
+@click.option('--until', type=click.DateTime(['%Y-%m-%d']), help='Last day of the series.')
+@click.option('--duration', type=int, help='Minutes per show.')
+@with_appcontext
+def book_recurring_command(venue_id, artist_id, start, every_days, count, until, duration):
+  """Book a series of shows in one transaction, e.g. every Friday for a
+  year: book-recurring 3 7 "2027-01-01 21:00" --until 2027-12-31"""
+  if until:
+    until = until.replace(hour=23, minute=59)
+  try:
+    starts = bookings.recurring(start, timedelta(days=every_days), count, until)
+    rows = bookings.book(venue_id, artist_id, starts, duration)
+  except bookings.BookingError as e:
+    db.session.rollback()
+    for show in e.conflicts:
+      click.echo(f'  show {show["id"]}: venue {show["venue_id"]}, artist {show["artist_id"]}, '
+                 f'{show["start_time"]:%Y-%m-%d %H:%M} to {show["end_time"]:%H:%M}', err=True)
+    raise click.ClickException(str(e))
+  db.session.commit()
+  bookings.invalidate(rows)
+  click.echo(f'Booked {len(rows)} shows from {rows[0]["time"]:%Y-%m-%d} to {rows[-1]["time"]:%Y-%m-%d}.')
+
+#  Query plans
+#  ----------------------------------------------------------------
+
+# SQLite reports "SCAN Show" for a full table scan, "SCAN Show USING INDEX"
+# for an ordered index scan and "SEARCH Show USING INDEX" for an index seek.
+sqlite_full_scan = re.compile(r'^SCAN "?Show"?( AS \w+)?$')
+
+def route_requests():
+  venue = db.session.query(Venue.id).first()
+  artist = db.session.query(Artist.id).first()
+  if venue is None or artist is None or db.session.query(Show.id).first() is None:
+    raise click.ClickException('The database has no shows, run "flask seed" first.')
+  return [
+    ('GET', '/venues', None),
+    ('GET', '/artists', None),
+    ('GET', '/shows', None),
+    ('GET', f'/venues/{venue.id}', None),
+    ('GET', f'/artists/{artist.id}', None),
+    ('POST', '/venues/search', {'search_term': 'venue'}),
+    ('POST', '/artists/search', {'search_term': 'artist'}),
+  ]
+
+def explain(connection, statement, parameters):
+  # returns the plan lines that scan the whole Show table
+  dialect = connection.dialect.name
+  if dialect == 'sqlite':
+    plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+    return [row[3] for row in plan if sqlite_full_scan.match(row[3])]
+  if dialect == 'postgresql':
+    # tiny seeded tables make a seq scan the cheapest plan, so only fall
+    # back to one when no index can answer the query
+    with connection.begin():
+      connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+      plan = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+      return [row[0].strip() for row in plan if 'Seq Scan on "Show"' in row[0]]
+  raise click.ClickException(f'EXPLAIN is not supported for {dialect}.')
+
+def explain_routes():
+  """Request the main routes and EXPLAIN every query they run against
+  Show. Returns (path, statement, full scan plan lines) per query."""
+  requests = route_requests()
+  db.session.remove()
+  # cached pages and fragments would skip their queries
+  page_cache.backend.clear()
+  fragments.clear()
+
+  statements = []
+  def capture(conn, cursor, statement, parameters, context, executemany):
+    if '"Show"' in statement and statement.lstrip().upper().startswith('SELECT'):
+      statements.append((request_path, statement, parameters))
+
+  # GET requests read from the replicas, when there are any
+  client = current_app.test_client()
+  engines = set(db.engines.values())
+  for engine in engines:
+    event.listen(engine, 'before_cursor_execute', capture)
+  try:
+    for method, request_path, data in requests:
+      response = client.open(request_path, method=method, data=data)
+      if response.status_code != 200:
+        raise click.ClickException(f'{method} {request_path} returned {response.status_code}.')
+  finally:
+    for engine in engines:
+      event.remove(engine, 'before_cursor_execute', capture)
+
+  with db.engine.connect() as connection:
+    return [(path, statement, explain(connection, statement, parameters))
+            for path, statement, parameters in statements]
+
+@click.command('explain-routes')
+@with_appcontext
+def explain_routes_command():
+  """EXPLAIN every query the main routes run against Show and fail if
+  any of them falls back to a full scan of the table."""
+  plans = explain_routes()
+  failures = 0
+  for path, statement, full_scans in plans:
+    click.echo(f'{"FULL SCAN" if full_scans else "ok":9} {path}')
+    for line in full_scans:
+      click.echo(f'          {line}')
+      click.echo(f'          {" ".join(statement.split())}')
+    failures += bool(full_scans)
+
+  if failures:
+    raise click.ClickException(f'{failures} queries scan the whole Show table.')
+  click.echo(f'{len(plans)} queries on Show use an index.')
+
+#  Bulk data
+#  ----------------------------------------------------------------
+
+def file_format(path, format):
+  if format:
+    return format
+  return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(allow_dash=True))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=5000)
+@with_appcontext
+def import_command(kind, path, format, chunk_size):
+  """Import venues, artists or shows from a CSV or NDJSON file."""
+  def progress(inserted, skipped, seconds):
+    click.echo(f'{inserted} inserted, {skipped} skipped, {inserted / max(seconds, 1e-9):.0f} rows/s', err=True)
+
+  with click.open_file(path) as file:
+    inserted, skipped, seconds = bulk.import_rows(kind, file, file_format(path, format), chunk_size, progress)
+  click.echo(f'Imported {inserted} {kind} in {seconds:.1f}s ({skipped} skipped).', err=True)
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(allow_dash=True))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=5000)
+@with_appcontext
+def export_command(kind, path, format, chunk_size):
+  """Export venues, artists or shows to a CSV or NDJSON file."""
+  with click.open_file(path, 'w') as file:
+    count = bulk.export_rows(kind, file, file_format(path, format), chunk_size)
+  click.echo(f'Exported {count} {kind}.', err=True)
+
+#  Benchmarks
+#  ----------------------------------------------------------------
+
+@click.group('bench')
+def bench_group():
+  """Run performance benchmarks."""
+
+@bench_group.command('datetime-filter')
+@click.option('--shows', default=100000)
+@with_appcontext
+def bench_datetime_filter_command(shows):
+  """Per-call cost of the datetime filter."""
+  result = bench.bench_datetime_filter(shows)
+  for name, seconds in result.items():
+    click.echo(f'{name:7} {seconds * 1e6:8.2f} us/call')
+  click.echo(f'speedup {result["before"] / result["after"]:.1f}x over {shows} shows')
+
+@bench_group.command('suggest')
+@click.option('--prefixes', default=200)
+@with_appcontext
+def bench_suggest_command(prefixes):
+  """Name suggestions from the prefix index against name search queries."""
+  try:
+    result = bench.bench_suggest(bench.suggest_prefixes(prefixes))
+  except ValueError as e:
+    raise click.ClickException(str(e))
+  click.echo(f'search  {result["search"] * 1e3:8.3f} ms/lookup')
+  click.echo(f'index   {result["index"] * 1e3:8.3f} ms/lookup')
+  click.echo(f'speedup {result["search"] / result["index"]:.0f}x, index built in {result["build"] * 1e3:.0f} ms')
+
+@bench_group.command('search')
+@click.option('--terms', default=100)
+@with_appcontext
+def bench_search_command(terms):
+  """Unified search against the original per-model search queries."""
+  try:
+    result = bench.bench_search(bench.search_terms(terms))
+  except ValueError as e:
+    raise click.ClickException(str(e))
+  for name, seconds in result.items():
+    click.echo(f'{name:7} {seconds * 1e3:8.3f} ms/search')
+  click.echo(f'speedup {result["before"] / result["after"]:.1f}x over {terms} terms')
+
+@bench_group.command('templates')
+@click.option('--rounds', default=5)
+@with_appcontext
+def bench_templates_command(rounds):
+  """Template load time of a fresh worker, with and without bytecode cache."""
+  result = bench.bench_templates(current_app._get_current_object(), rounds)
+  click.echo(f'compile  {result["compile"] * 1e3:8.2f} ms')
+  click.echo(f'bytecode {result["bytecode"] * 1e3:8.2f} ms')
+  click.echo(f'speedup {result["compile"] / result["bytecode"]:.1f}x over {result["templates"]} templates')
+
+@bench_group.command('logging')
+@click.option('--threads', default=8)
+@click.option('--requests', default=25, help='Requests of each kind per thread.')
+@click.option('--write-delay', default=0.0, help='Milliseconds added to every log write.')
+@with_appcontext
+def bench_logging_command(threads, requests, write_delay):
+  """Request latency under concurrency, logging on the request threads
+  against logging through the queue."""
+  try:
+    results = bench.bench_logging(current_app._get_current_object(), threads, requests,
+                                  write_delay / 1000)
+  except ValueError as e:
+    raise click.ClickException(str(e))
+  click.echo(f'{"mode":7} {"route":8} {"p50 ms":>8} {"p95 ms":>8}')
+  for mode, routes in results.items():
+    for name, result in routes.items():
+      click.echo(f'{mode:7} {name:8} {result["p50_ms"]:8.2f} {result["p95_ms"]:8.2f}')
+
+@bench_group.command('routes')
+@click.option('--iterations', default=50)
+@click.option('--cache/--no-cache', default=False, help='Serve cached pages (off by default).')
+@click.option('--save', type=click.Path(), help='Write the results to this JSON file.')
+@click.option('--compare', 'baseline', type=click.File(), help='Compare against a saved JSON file.')
+@click.option('--tolerance', default=0.2, help='Allowed p95 slowdown against the baseline.')
+@with_appcontext
+def bench_routes_command(iterations, cache, save, baseline, tolerance):
+  """Latency, queries and memory per request of the main routes."""
+  try:
+    results = bench.bench_routes(current_app._get_current_object(), iterations, cache)
+  except ValueError as e:
+    raise click.ClickException(str(e))
+
+  click.echo(f'{"route":15} {"p50 ms":>8} {"p95 ms":>8} {"queries":>8} {"peak KB":>8}')
+  for name, result in results.items():
+    click.echo(f'{name:15} {result["p50_ms"]:8.2f} {result["p95_ms"]:8.2f} '
+               f'{result["queries"]:8g} {result["peak_kb"]:8.1f}')
+  if save:
+    with open(save, 'w') as file:
+      json.dump(results, file, indent=2)
+  if baseline:
+    lines, regressions = bench.compare(results, json.load(baseline), tolerance)
+    click.echo('\n'.join(['', 'against baseline:'] + lines))
+    if regressions:
+      raise click.ClickException(f'Slower than the baseline: {", ".join(regressions)}')
+
+def register_commands(app):
+  app.cli.add_command(seed_command)
+  app.cli.add_command(recount_shows_command)
+  app.cli.add_command(resume_jobs_command)
+  app.cli.add_command(build_assets_command)
+  app.cli.add_command(book_recurring_command)
+  app.cli.add_command(explain_routes_command)
+  app.cli.add_command(bench_group)
+  app.cli.add_command(import_command)
+  app.cli.add_command(export_command)
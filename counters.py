@@ -0,0 +1,88 @@
+from datetime import datetime
+from models import db, Venue, Artist, Show, show_sides
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+# Venue and Artist rows carry upcoming_shows_count, past_shows_count and
+# next_show_time, so pages can show counts without counting the Show table.
+#
+# New shows are added to the counters in the same transaction as their
+# insert (add_shows). Deletes recount the venues/artists that lost shows
+# (recount), one indexed count per row. As time passes upcoming shows
+# become past ones: roll_over(), run periodically by "flask recount-shows",
+# recounts the rows whose next_show_time has gone by. Until it runs, a row
+# with next_show_time <= now has stale counts, see is_stale().
+
+def recount_statement(model, now):
+  # UPDATE setting the counters of every row from correlated subqueries on
+  # the (venue_id|artist_id, time) index of Show
+  table = model.__table__
+  column = show_sides(model)[0]
+  count = lambda *criteria: db.select(db.func.count()).select_from(Show).where(
+    column == table.c.id, *criteria).scalar_subquery()
+  return table.update().values(
+    upcoming_shows_count=count(Show.time > now),
+    past_shows_count=count(Show.time <= now),
+    next_show_time=db.select(db.func.min(Show.time)).where(
+      column == table.c.id, Show.time > now).scalar_subquery()
+  )
+
+def recount(model, ids=None, now=None, chunk_size=500):
+  """Recount the counters of the `model` rows with the given ids, or of
+  all rows. Returns the number of rows updated."""
+  statement = recount_statement(model, now or datetime.now())
+  if ids is None:
+    return db.session.execute(statement).rowcount
+  ids = list(ids)
+  updated = 0
+  for start in range(0, len(ids), chunk_size):
+    chunk = ids[start:start + chunk_size]
+    updated += db.session.execute(statement.where(model.__table__.c.id.in_(chunk))).rowcount
+  return updated
+
+def roll_over(now=None):
+  """Recount the venues and artists whose next show has started, moving it
+  from upcoming to past. Returns {model name: rows updated}."""
+  now = now or datetime.now()
+  updated = {}
+  for model in (Venue, Artist):
+    table = model.__table__
+    statement = recount_statement(model, now).where(table.c.next_show_time <= now)
+    updated[model.__name__] = db.session.execute(statement).rowcount
+  return updated
+
+def add_shows(shows, now=None):
+  """Add new shows, dicts with venue_id, artist_id and time, to the
+  counters: one executemany UPDATE per model for any number of shows."""
+  now = now or datetime.now()
+  for model in (Venue, Artist):
+    key = show_sides(model)[0].key
+    totals = {}
+    for show in shows:
+      upcoming, past, next_time = totals.get(show[key], (0, 0, None))
+      if show['time'] > now:
+        upcoming += 1
+        next_time = min(next_time or show['time'], show['time'])
+      else:
+        past += 1
+      totals[show[key]] = (upcoming, past, next_time)
+    if not totals:
+      continue
+
+    table = model.__table__
+    next_time = db.bindparam('next_time', type_=db.DateTime)
+    statement = table.update().where(table.c.id == db.bindparam('entity_id')).values(
+      upcoming_shows_count=table.c.upcoming_shows_count + db.bindparam('upcoming', type_=db.Integer),
+      past_shows_count=table.c.past_shows_count + db.bindparam('past', type_=db.Integer),
+      next_show_time=db.case(
+        (db.or_(table.c.next_show_time.is_(None), table.c.next_show_time > next_time), next_time),
+        else_=table.c.next_show_time)
+    )
+    db.session.execute(statement, [
+      {'entity_id': id, 'upcoming': upcoming, 'past': past, 'next_time': next_time}
+      for id, (upcoming, past, next_time) in totals.items()])
+
+def is_stale(entity, now):
+  # the counters of a row miss shows that started since the last roll over
+  return entity.next_show_time is not None and entity.next_show_time <= now
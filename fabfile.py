@@ -1,3 +1,4 @@
+import os
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
@@ -6,9 +7,11 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        command = "python -m pytest -q && flask explain-routes"
+        # compare with a baseline saved by "flask bench routes --save"
+        if os.path.exists("bench_baseline.json"):
+            command += " && flask bench routes --compare bench_baseline.json"
+        result = local(command, capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -39,9 +42,7 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    local("heroku run flask explain-routes")
 
 
 def deploy():
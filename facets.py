@@ -0,0 +1,83 @@
+from flask import url_for
+from models import db, Venue, Artist, VenueGenre, ArtistGenre
+
+#----------------------------------------------------------------------------#
+# Genre, city and state facets.
+#----------------------------------------------------------------------------#
+# /venues and /artists take ?genre=...&city=...&state=... filters; several
+# genre parameters must all match. Genres are looked up in the VenueGenre/
+# ArtistGenre tables through their (genre, id) primary key, city and state
+# through the (state, city) index.
+#
+# The number of matching rows per genre, city and state comes from one
+# query: the filtered rows as a CTE, grouped three ways under UNION ALL.
+
+genre_tables = {Venue: (VenueGenre, VenueGenre.venue_id),
+                Artist: (ArtistGenre, ArtistGenre.artist_id)}
+
+def parse_filters(args):
+  return {
+    'genre': [genre for genre in args.getlist('genre') if genre],
+    'city': args.get('city') or None,
+    'state': args.get('state') or None,
+  }
+
+def apply_filters(query, model, filters):
+  genre_table, owner = genre_tables[model]
+  for genre in filters['genre']:
+    query = query.filter(db.exists().where(genre_table.genre == genre, owner == model.id))
+  if filters['state']:
+    query = query.filter(model.state == filters['state'])
+  if filters['city']:
+    query = query.filter(model.city == filters['city'])
+  return query
+
+def facet_url(endpoint, filters, kind, value):
+  # link toggling one facet value on or off, keeping the other filters
+  genres, city, state = list(filters['genre']), filters['city'], filters['state']
+  if kind == 'genre':
+    genres = [genre for genre in genres if genre != value] if value in genres else genres + [value]
+  elif kind == 'city':
+    city, state = (None, state) if (city, state) == value else value
+  else:
+    city, state = (None, None) if state == value else (None, value)
+  return url_for(endpoint, genre=genres, city=city, state=state)
+
+def facet_counts(model, filters, endpoint, limit=20):
+  """{'genre'|'city'|'state': [{label, count, active, url}]} for the
+  `model` rows matching `filters`: the `limit` most frequent values of
+  each facet, and the active ones."""
+  genre_table, owner = genre_tables[model]
+  matched = apply_filters(db.session.query(model.id, model.city, model.state),
+                          model, filters).cte('matched')
+
+  genres = db.select(
+      db.literal('genre'), genre_table.genre, db.null(), db.func.count()
+    ).join(matched, matched.c.id == owner).group_by(genre_table.genre)
+  cities = db.select(
+      db.literal('city'), matched.c.city, matched.c.state, db.func.count()
+    ).group_by(matched.c.city, matched.c.state)
+  states = db.select(
+      db.literal('state'), matched.c.state, db.null(), db.func.count()
+    ).group_by(matched.c.state)
+
+  facets = {'genre': [], 'city': [], 'state': []}
+  for kind, value, state, count in db.session.execute(db.union_all(genres, cities, states)):
+    if value is None:
+      continue
+    if kind == 'city':
+      label, value = (f'{value}, {state}' if state else value), (value, state)
+      active = (filters['city'], filters['state']) == value
+    else:
+      label = value
+      active = value in filters['genre'] if kind == 'genre' else filters['state'] == value
+    facets[kind].append({
+      'label': label,
+      'count': count,
+      'active': active,
+      'url': facet_url(endpoint, filters, kind, value),
+    })
+  for kind, values in facets.items():
+    values.sort(key=lambda facet: (-facet['count'], facet['label']))
+    facets[kind] = [facet for i, facet in enumerate(values) if i < limit or facet['active']]
+  return facets
@@ -1,8 +1,11 @@
 from datetime import datetime
 from flask_wtf import FlaskForm
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
 from wtforms.validators import DataRequired, AnyOf, URL, Length, ValidationError
 import re
+import logging
+
+log = logging.getLogger('fyyur.forms')
 
 state_choices = [
     ('AL', 'AL'),
@@ -92,6 +95,9 @@ class ShowForm(FlaskForm):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    duration = IntegerField(
+        'duration', default=120
+    )
 
 class VenueForm(FlaskForm):
     
@@ -138,7 +144,7 @@ class VenueForm(FlaskForm):
 
     def validate_phone(self, phone):
         if not re.search(r"^[0-9]{3}-[0-9]{3}-[0-9]{4}$", phone.data):
-            print ('something happend')
+            log.debug('invalid venue phone number %r', phone.data)
             raise ValidationError("Invalid phone number.")
 
 
@@ -0,0 +1,94 @@
+import os
+import time
+from jinja2 import nodes, FileSystemBytecodeCache
+from jinja2.ext import Extension
+from cache import LRUCache
+
+#----------------------------------------------------------------------------#
+# Template compilation and fragment cache.
+#----------------------------------------------------------------------------#
+# Compiled templates are kept on disk in TEMPLATE_CACHE_DIR (a Jinja
+# bytecode cache, keyed on the template source), so a restarted worker
+# loads them instead of compiling them again. warm() loads every template
+# while the app starts, before the first request.
+#
+# {% cache 'name', version, ... %}...{% endcache %} renders its body once
+# per distinct list of key parts and serves the stored HTML after that.
+# Pages pass the data version of what the body shows (see versions.py), so
+# a changed row makes a new key and old entries age out of the LRU. A None
+# part means the body cannot be versioned: it is rendered every time.
+
+class FragmentCacheExtension(Extension):
+  tags = {'cache'}
+
+  def __init__(self, environment):
+    super().__init__(environment)
+    environment.extend(fragment_cache=None)
+
+  def parse(self, parser):
+    lineno = next(parser.stream).lineno
+    parts = [parser.parse_expression()]
+    while parser.stream.skip_if('comma'):
+      parts.append(parser.parse_expression())
+    body = parser.parse_statements(['name:endcache'], drop_needle=True)
+    call = self.call_method('render_fragment', [nodes.List(parts)])
+    return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+  def render_fragment(self, parts, caller):
+    fragments = self.environment.fragment_cache
+    if fragments is None or any(part is None for part in parts):
+      return caller()
+    return fragments.fetch(':'.join(str(part) for part in parts), caller)
+
+class Fragments(object):
+  """Fragment cache of the {% cache %} tag, counting hits and misses."""
+
+  def __init__(self, app=None):
+    self.cache = None
+    self.hits = 0
+    self.misses = 0
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('TEMPLATE_CACHE_DIR', None)
+    app.config.setdefault('FRAGMENT_CACHE_SIZE', 256)
+    app.config.setdefault('FRAGMENT_CACHE_TTL', 300)
+    if app.config['TEMPLATE_CACHE_DIR']:
+      os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+      app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+    self.cache = LRUCache(app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL'])
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = self
+    app.extensions['fragments'] = self
+
+  def fetch(self, key, render):
+    html = self.cache.get(key)
+    if html is None:
+      self.misses += 1
+      html = render()
+      self.cache.set(key, html)
+    else:
+      self.hits += 1
+    return html
+
+  def clear(self):
+    self.cache.clear()
+
+  def stats(self):
+    return {'hits': self.hits, 'misses': self.misses}
+
+def template_names(env):
+  return env.list_templates(filter_func=lambda name: name.endswith('.html'))
+
+def warm(app):
+  """Compile (or load from the bytecode cache) every template of the app.
+  Call it once the app's filters and globals are registered, which the
+  templates are checked against. Returns (templates, seconds)."""
+  start = time.perf_counter()
+  names = template_names(app.jinja_env)
+  for name in names:
+    app.jinja_env.get_template(name)
+  return len(names), time.perf_counter() - start
+
+fragments = Fragments()
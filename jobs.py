@@ -0,0 +1,205 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from models import db, Venue, Artist, Show, Job, show_sides
+from cache import page_cache
+from suggest import suggestions
+import counters
+
+#----------------------------------------------------------------------------#
+# Background jobs.
+#----------------------------------------------------------------------------#
+# Work too slow for a request runs on a pool of JOB_WORKERS threads in the
+# app process. enqueue() stores a Job row and hands its id to the pool once
+# the row is committed. The job's function runs in its own app context and
+# session, and reports progress on the row, which /jobs/<id> serves. A job
+# that raises is queued again after JOB_RETRY_DELAY seconds, up to
+# JOB_MAX_RETRIES times, and then marked failed. Enqueueing a job while one
+# of the same kind and params is queued or running returns that one.
+#
+# Jobs queued or running when a process stops stay in the table; "flask
+# resume-jobs" runs them to the end.
+
+tasks = {}
+
+def task(kind):
+  """Register a job function, called as func(job, **params). It may call
+  job.report(progress, total) and should commit its own work."""
+  def decorator(func):
+    tasks[kind] = func
+    return func
+  return decorator
+
+class Runner(object):
+
+  def __init__(self, app=None):
+    self.lock = threading.Lock()
+    self.pool = None
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('JOB_WORKERS', 2)
+    app.config.setdefault('JOB_MAX_RETRIES', 2)
+    app.config.setdefault('JOB_RETRY_DELAY', 5)
+    app.config.setdefault('JOB_LARGE_DELETE', 10000)
+    app.config.setdefault('JOB_DELETE_CHUNK_SIZE', 5000)
+    app.extensions['jobs'] = self
+
+  def executor(self, app):
+    # made on first use, so a process forked after create_app() gets its
+    # own threads
+    with self.lock:
+      if self.pool is None:
+        self.pool = ThreadPoolExecutor(app.config['JOB_WORKERS'], thread_name_prefix='job')
+      return self.pool
+
+  def enqueue(self, kind, **params):
+    """Store a job and start it in the background. Commits the session.
+    Returns the queued or running job of the same kind and params instead,
+    if there is one."""
+    if kind not in tasks:
+      raise ValueError(f'unknown job: {kind}')
+    job = self.pending(kind, params)
+    if job is not None:
+      return job
+    job = Job(kind=kind, params=params, status='queued')
+    db.session.add(job)
+    db.session.commit()
+    self.submit(current_app._get_current_object(), job.id)
+    return job
+
+  def pending(self, kind, params):
+    # few jobs are ever pending, so params are compared here rather than
+    # in JSON operators that differ between databases
+    jobs = db.session.query(Job).filter(Job.kind == kind, Job.status.in_(('queued', 'running')))
+    return next((job for job in jobs.order_by(Job.id) if job.params == params), None)
+
+  def submit(self, app, job_id, delay=0):
+    if delay:
+      timer = threading.Timer(delay, self.submit, (app, job_id))
+      timer.daemon = True
+      timer.start()
+    else:
+      self.executor(app).submit(self.run, app, job_id)
+
+  def run(self, app, job_id, resubmit=True):
+    """Run one attempt of a job. Returns the job's status afterwards;
+    'queued' when it failed and will be retried, after JOB_RETRY_DELAY
+    seconds on the pool unless resubmit is False."""
+    with app.app_context():
+      job = db.session.get(Job, job_id)
+      if job is None or job.status not in ('queued', 'running'):
+        return job and job.status
+      job.status = 'running'
+      job.attempts += 1
+      job.started_at = datetime.utcnow()
+      db.session.commit()
+
+      context = JobContext(job_id, job.progress)
+      try:
+        message = tasks[job.kind](context, **job.params)
+      except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('job %s (%s) failed', job_id, job.kind)
+        job = db.session.get(Job, job_id)
+        retry = job.attempts <= app.config['JOB_MAX_RETRIES']
+        job.status = 'queued' if retry else 'failed'
+        job.message = f'{type(e).__name__}: {e}'
+        if not retry:
+          job.finished_at = datetime.utcnow()
+        db.session.commit()
+        if retry and resubmit:
+          self.submit(app, job_id, app.config['JOB_RETRY_DELAY'])
+        return job.status
+
+      job = db.session.get(Job, job_id)
+      job.status = 'succeeded'
+      job.message = message
+      if job.total is not None:
+        job.progress = job.total
+      job.finished_at = datetime.utcnow()
+      db.session.commit()
+      return job.status
+
+  def shutdown(self, wait=True):
+    with self.lock:
+      if self.pool is not None:
+        self.pool.shutdown(wait=wait)
+        self.pool = None
+
+class JobContext(object):
+  """What a job function sees of its job. progress is what earlier attempts
+  reported, for a job that resumes where they stopped."""
+
+  def __init__(self, job_id, progress=0):
+    self.id = job_id
+    self.progress = progress
+
+  def report(self, progress, total=None):
+    # its own statement and commit, so /jobs/<id> sees it right away
+    self.progress = progress
+    values = {'progress': progress}
+    if total is not None:
+      values['total'] = total
+    db.session.execute(Job.__table__.update().where(Job.__table__.c.id == self.id).values(**values))
+    db.session.commit()
+
+#  Tasks
+#  ----------------------------------------------------------------
+
+def delete_entity(model, id, job=None, chunk_size=None):
+  """Delete a venue or artist with its shows, and update the counters and
+  cached pages of the artists or venues it played with. With chunk_size,
+  shows go `chunk_size` per transaction, each recounting the rows it
+  touched, so a job stopped halfway leaves consistent counters behind, and
+  its next attempt counts on from the shows already deleted. Returns the
+  number of shows deleted."""
+  column, other, other_column = show_sides(model)
+  kind, other_kind = model.__name__.lower(), other.__name__.lower()
+
+  def delete_shows(criterion, other_ids):
+    # one statement, without loading the shows into the session
+    count = db.session.query(Show).filter(criterion).delete(synchronize_session=False)
+    counters.recount(other, other_ids)
+    return count
+
+  deleted = job.progress if job else 0
+  other_ids = []
+  if chunk_size:
+    if job:
+      remaining = db.session.query(db.func.count()).filter(column == id).scalar()
+      job.report(deleted, deleted + remaining)
+    while True:
+      rows = db.session.query(Show.id, other_column).filter(column == id).limit(chunk_size).all()
+      touched = {other_id for show_id, other_id in rows}
+      deleted += delete_shows(Show.id.in_([show_id for show_id, other_id in rows]), touched)
+      db.session.commit()
+      page_cache.invalidate(*[f'{other_kind}:{other_id}' for other_id in touched])
+      if job:
+        job.report(deleted)
+      if len(rows) < chunk_size:
+        break
+  else:
+    # venues/artists whose pages list shows of this one
+    other_ids = [other_id for other_id, in db.session.query(other_column).filter(column == id).distinct()]
+    deleted += delete_shows(column == id, other_ids)
+
+  db.session.query(model).filter(model.id == id).delete(synchronize_session=False)
+  db.session.commit()
+  page_cache.invalidate(f'{kind}:{id}', *[f'{other_kind}:{other_id}' for other_id in other_ids])
+  suggestions.remove(kind, int(id))
+  return deleted
+
+@task('delete_venue')
+def delete_venue_task(job, venue_id):
+  deleted = delete_entity(Venue, venue_id, job, current_app.config['JOB_DELETE_CHUNK_SIZE'])
+  return f'Deleted venue {venue_id} and {deleted} shows.'
+
+@task('delete_artist')
+def delete_artist_task(job, artist_id):
+  deleted = delete_entity(Artist, artist_id, job, current_app.config['JOB_DELETE_CHUNK_SIZE'])
+  return f'Deleted artist {artist_id} and {deleted} shows.'
+
+runner = Runner()
@@ -0,0 +1,136 @@
+from flask import current_app
+from models import db, Venue, Artist, Show, show_sides
+from pagination import encode_cursor
+from serializers import show_tile, show_dict
+import counters
+
+#----------------------------------------------------------------------------#
+# Show sections.
+#----------------------------------------------------------------------------#
+# Venue and artist pages list upcoming and past shows in separate sections.
+# Each section is its own LIMITed query on the (venue_id|artist_id, time)
+# index, continued by a (time, id) cursor, so a page never loads more than
+# one page of shows however long the history is.
+
+def current_counts(rows, now_time):
+  """{id: (upcoming, past)} show counts of venues or artists of one model:
+  their stored counters, or, for rows whose counters are stale (see
+  counters.is_stale), their shows counted in one grouped query."""
+  counts = {row.id: (row.upcoming_shows_count, row.past_shows_count) for row in rows}
+  stale = [row.id for row in rows if counters.is_stale(row, now_time)]
+  if stale:
+    column = show_sides(type(rows[0]))[0]
+    found = db.session.query(
+        column,
+        db.func.count(db.case((Show.time > now_time, 1))),
+        db.func.count(db.case((Show.time <= now_time, 1)))
+      ).filter(column.in_(stale)).group_by(column)
+    found = {id: (upcoming, past) for id, upcoming, past in found}
+    counts.update((id, found.get(id, (0, 0))) for id in stale)
+  return counts
+
+def show_section(entity_column, entity_id, other, when, now_time, cursor=None):
+  """Return (shows, next_cursor) for one page of the `when` ('upcoming' or
+  'past') shows of a venue or artist. `other` is the model shown on each
+  tile: Artist on venue pages, Venue on artist pages."""
+  per_page = current_app.config['SECTION_SHOWS_PER_PAGE']
+  other_column = show_sides(other)[0]
+  query = db.session.query(
+      Show.id, Show.time, other.id, other.name, other.image_link
+    ).join(other, other.id == other_column
+    ).filter(entity_column == entity_id)
+
+  # upcoming shows run soonest first, past shows most recent first
+  key = db.tuple_(Show.time, Show.id)
+  if when == 'upcoming':
+    query = query.filter(Show.time > now_time).order_by(Show.time, Show.id)
+    if cursor:
+      query = query.filter(key > cursor)
+  else:
+    query = query.filter(Show.time <= now_time).order_by(Show.time.desc(), Show.id.desc())
+    if cursor:
+      query = query.filter(key < cursor)
+
+  rows = query.limit(per_page + 1).all()
+  next_cursor = None
+  if len(rows) > per_page:
+    rows = rows[:per_page]
+    next_cursor = encode_cursor(rows[-1].time, rows[-1].id)
+
+  prefix = 'artist' if other is Artist else 'venue'
+  shows = [show_tile(prefix, other_id, name, image_link, time)
+           for show_id, time, other_id, name, image_link in rows]
+  return shows, next_cursor
+
+def entity_shows(entity, now_time):
+  """Return (fields, next_cursors) for the shows of a venue or artist
+  page: the upcoming/past counts and the first page of both sections, and
+  the cursors continuing each section."""
+  column, other, other_column = show_sides(type(entity))
+  upcoming_count, past_count = current_counts([entity], now_time)[entity.id]
+  upcoming_shows, upcoming_next = show_section(column, entity.id, other, 'upcoming', now_time)
+  past_shows, past_next = show_section(column, entity.id, other, 'past', now_time)
+
+  fields = {
+    "past_shows": past_shows,
+    "upcoming_shows": upcoming_shows,
+    "past_shows_count": past_count,
+    "upcoming_shows_count": upcoming_count
+  }
+  return fields, {'upcoming': upcoming_next, 'past': past_next}
+
+def iter_upcoming(entity_column, entity_id, other, now_time, chunk_size=1000):
+  """The upcoming shows of a venue or artist, soonest first, as (show id,
+  time, duration, updated_at, other id, other name) rows read from a
+  server-side cursor `chunk_size` rows at a time. `other` is the model on
+  the other side, as for show_section()."""
+  other_column = show_sides(other)[0]
+  query = db.session.query(
+      Show.id, Show.time, Show.duration, Show.updated_at, other.id, other.name
+    ).join(other, other.id == other_column
+    ).filter(entity_column == entity_id, Show.time > now_time
+    ).order_by(Show.time, Show.id)
+  return query.execution_options(stream_results=True).yield_per(chunk_size)
+
+#----------------------------------------------------------------------------#
+# Show feed.
+#----------------------------------------------------------------------------#
+# All shows, newest first, with the venue and artist columns joined into
+# the same query instead of lazy loaded per row. Pages are continued by a
+# (time, id) cursor on the time index.
+
+def feed_query(start=None, end=None):
+  query = db.session.query(
+      Show.id, Show.time, Show.venue_id, Venue.name,
+      Show.artist_id, Artist.name, Artist.image_link
+    ).join(Venue, Show.venue_id == Venue.id
+    ).join(Artist, Show.artist_id == Artist.id)
+  if start:
+    query = query.filter(Show.time >= start)
+  if end:
+    query = query.filter(Show.time < end)
+  return query
+
+def show_feed(cursor=None, per_page=None, start=None, end=None):
+  """Return (shows, next_cursor) for one page of the feed, optionally
+  limited to shows starting in [start, end)."""
+  per_page = per_page or current_app.config['SHOWS_PER_PAGE']
+  query = feed_query(start, end)
+  if cursor:
+    query = query.filter(db.tuple_(Show.time, Show.id) < cursor)
+
+  # fetch one extra row to know whether there is a next page
+  rows = query.order_by(Show.time.desc(), Show.id.desc()).limit(per_page + 1).all()
+  next_cursor = None
+  if len(rows) > per_page:
+    rows = rows[:per_page]
+    next_cursor = encode_cursor(rows[-1].time, rows[-1].id)
+  return [show_dict(*row) for row in rows], next_cursor
+
+def iter_shows(start=None, end=None, chunk_size=1000):
+  """Every show of the feed in [start, end), oldest first, read from a
+  server-side cursor `chunk_size` rows at a time."""
+  query = feed_query(start, end).order_by(Show.time, Show.id)
+  query = query.execution_options(stream_results=True).yield_per(chunk_size)
+  for row in query:
+    yield show_dict(*row)
@@ -0,0 +1,193 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request, has_request_context
+from flask.logging import default_handler
+
+#----------------------------------------------------------------------------#
+# Logging.
+#----------------------------------------------------------------------------#
+# The app logger and the 'fyyur.*' loggers of the modules hand their records
+# to a bounded in-memory queue. A QueueListener thread takes them from
+# there and writes them to LOG_FILE (stderr when unset), one JSON object per
+# line, so a request never waits on the disk. Request details are attached
+# on the request thread, before the record is queued. When the queue is
+# full, records are dropped and counted rather than blocking the request.
+#
+# Records below INFO can be sampled per logger: LOG_SAMPLE_RATES maps a
+# logger name to the fraction of its DEBUG records kept, for high volume
+# events like the 'fyyur.requests' line logged for every request.
+
+# attributes every LogRecord has, anything else came in through extra=
+record_attributes = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request'}
+
+def request_details():
+  if has_request_context():
+    return {'method': request.method, 'path': request.path, 'endpoint': request.endpoint}
+  return None
+
+class JSONFormatter(logging.Formatter):
+
+  def format(self, record):
+    data = {
+      'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+      'level': record.levelname,
+      'logger': record.name,
+      'message': record.getMessage(),
+    }
+    data.update((key, value) for key, value in vars(record).items() if key not in record_attributes)
+    details = getattr(record, 'request', None) or request_details()
+    if details:
+      data['request'] = details
+    if record.exc_info and not record.exc_text:
+      record.exc_text = self.formatException(record.exc_info)
+    if record.exc_text:
+      data['exception'] = record.exc_text
+    return json.dumps(data, default=str)
+
+class SamplingFilter(logging.Filter):
+  """Keep rates[name] of the records below INFO of logger `name` (or of
+  its closest configured parent); everything else passes."""
+
+  def __init__(self, rates):
+    super().__init__()
+    self.rates = rates
+
+  def rate(self, name):
+    while name:
+      if name in self.rates:
+        return self.rates[name]
+      name = name.rpartition('.')[0]
+    return 1.0
+
+  def filter(self, record):
+    if record.levelno >= logging.INFO:
+      return True
+    return random.random() < self.rate(record.name)
+
+class RequestQueueHandler(QueueHandler):
+  """QueueHandler that resolves everything needing the request thread
+  (message arguments, traceback, request details) before queueing, and
+  drops records when the queue is full."""
+
+  def __init__(self, queue):
+    super().__init__(queue)
+    self.dropped = 0
+
+  def prepare(self, record):
+    record = copy.copy(record)
+    record.msg = record.getMessage()
+    record.args = None
+    if record.exc_info:
+      record.exc_text = logging.Formatter().formatException(record.exc_info)
+      record.exc_info = None
+    record.request = request_details()
+    return record
+
+  def enqueue(self, record):
+    try:
+      self.queue.put_nowait(record)
+    except queue.Full:
+      self.dropped += 1
+
+class Logs(object):
+
+  def __init__(self, app=None):
+    self.handler = None
+    self.listener = None
+    self.running = False
+    self.hooked = False
+    self.loggers = []
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('LOG_FILE', None)
+    app.config.setdefault('LOG_LEVEL', 'INFO')
+    app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+    app.config.setdefault('LOG_SAMPLE_RATES', {})
+    self.loggers = [app.logger, logging.getLogger('fyyur')]
+    for logger in self.loggers:
+      logger.setLevel(app.config['LOG_LEVEL'])
+      # fyyur.* records go to our handler only, not also to the root logger
+      logger.propagate = False
+    app.logger.removeHandler(default_handler)
+    self.install(app, [output_handler(app.config['LOG_FILE'])])
+    app.before_request(self.start_request)
+    app.after_request(self.log_request)
+    app.extensions['logs'] = self
+
+    # once per process, whatever the number of apps
+    if not self.hooked:
+      self.hooked = True
+      atexit.register(self.stop)
+      # a listener thread does not survive fork(), restart it in the child
+      if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=self.restart)
+
+  def install(self, app, handlers, queued=True):
+    """Send the app's records to `handlers`, through the queue or, with
+    queued=False, written by the logging thread itself."""
+    self.stop()
+    for logger in self.loggers:
+      if self.handler is not None:
+        logger.removeHandler(self.handler)
+    if queued:
+      self.handler = RequestQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']))
+      self.listener = QueueListener(self.handler.queue, *handlers, respect_handler_level=True)
+      self.listener.start()
+      self.running = True
+    else:
+      self.handler = handlers[0]
+    self.handler.addFilter(SamplingFilter(app.config['LOG_SAMPLE_RATES']))
+    for logger in self.loggers:
+      logger.addHandler(self.handler)
+
+  def stop(self):
+    # write out the queued records and end the listener thread
+    if self.running:
+      self.running = False
+      self.listener.stop()
+
+  def restart(self):
+    if not self.running:
+      return
+    # the parent's queue may be full or locked by one of its threads: stop
+    # the dead listener on a fresh queue, whose sentinel is then dropped
+    maxsize = self.handler.queue.maxsize
+    self.listener.queue = queue.Queue(maxsize)
+    self.listener.stop()
+    self.listener.queue = self.handler.queue = queue.Queue(maxsize)
+    self.listener.start()
+
+  def dropped(self):
+    return getattr(self.handler, 'dropped', 0)
+
+  #  Request log
+  #  ----------------------------------------------------------------
+
+  def start_request(self):
+    g.log_start = time.perf_counter()
+
+  def log_request(self, response):
+    if 'log_start' in g:
+      request_log.debug('%s %s %s', request.method, request.full_path, response.status_code,
+                        extra={'status': response.status_code,
+                               'ms': round((time.perf_counter() - g.log_start) * 1000, 1)})
+    return response
+
+def output_handler(path=None):
+  handler = logging.FileHandler(path) if path else logging.StreamHandler()
+  handler.setFormatter(JSONFormatter())
+  return handler
+
+request_log = logging.getLogger('fyyur.requests')
+
+logs = Logs()
@@ -0,0 +1,159 @@
+import bisect
+import threading
+import time
+from flask import (g, request, current_app, has_app_context,
+                   has_request_context, Response)
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+# Every request records its latency, the number and total time of its SQL
+# statements and the time spent rendering templates, labelled by endpoint.
+# The totals are served in the Prometheus text format at /metrics, and each
+# response reports its own numbers in a Server-Timing header.
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram(object):
+  """Cumulative-bucket histogram of observed values, per label."""
+
+  def __init__(self, buckets=latency_buckets):
+    self.buckets = buckets
+    self.series = {}
+
+  def observe(self, label, value):
+    counts, total = self.series.get(label, ([0] * (len(self.buckets) + 1), 0.0))
+    counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.series[label] = (counts, total + value)
+
+  def render(self, name, label_name):
+    lines = []
+    for label, (counts, total) in sorted(self.series.items()):
+      cumulative = 0
+      for bound, count in zip(self.buckets + ('+Inf',), counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+      lines.append(f'{name}_sum{{{label_name}="{label}"}} {total:.6f}')
+      lines.append(f'{name}_count{{{label_name}="{label}"}} {cumulative}')
+    return lines
+
+class Metrics(object):
+
+  def __init__(self, app=None):
+    self.lock = threading.Lock()
+    self.request_duration = Histogram()
+    self.template_duration = Histogram()
+    self.sql_statements = {}
+    self.sql_seconds = {}
+    self.listening = False
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('SLOW_REQUEST_MS', 500)
+    app.config.setdefault('SLOW_QUERY_MS', 100)
+    app.before_request(self.start_request)
+    app.after_request(self.finish_request)
+    app.add_url_rule('/metrics', 'metrics', self.render)
+    before_render_template.connect(self.start_template, app)
+    template_rendered.connect(self.finish_template, app)
+    if not self.listening:
+      # engines come and go with apps, listen on all of them
+      event.listen(Engine, 'before_cursor_execute', self.start_query)
+      event.listen(Engine, 'after_cursor_execute', self.finish_query)
+      self.listening = True
+    app.extensions['metrics'] = self
+
+  #  Hooks
+  #  ----------------------------------------------------------------
+
+  def start_request(self):
+    g.metrics_start = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+    g.template_seconds = 0.0
+
+  def start_query(self, conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+  def finish_query(self, conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'sql_statements' in g:
+      g.sql_statements += 1
+      g.sql_seconds += seconds
+    if has_app_context() and seconds * 1000 >= current_app.config['SLOW_QUERY_MS']:
+      current_app.logger.warning('slow query (%.0f ms): %s', seconds * 1000, ' '.join(statement.split()))
+
+  def start_template(self, app, template, context, **extra):
+    if 'metrics_start' in g:
+      g.template_start = time.perf_counter()
+
+  def finish_template(self, app, template, context, **extra):
+    if 'template_start' in g:
+      seconds = time.perf_counter() - g.pop('template_start')
+      g.template_seconds += seconds
+      with self.lock:
+        self.template_duration.observe(template.name, seconds)
+
+  def finish_request(self, response):
+    if 'metrics_start' not in g or request.endpoint == 'metrics':
+      return response
+    seconds = time.perf_counter() - g.metrics_start
+    endpoint = request.endpoint or 'none'
+    with self.lock:
+      self.request_duration.observe(endpoint, seconds)
+      self.sql_statements[endpoint] = self.sql_statements.get(endpoint, 0) + g.sql_statements
+      self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + g.sql_seconds
+
+    response.headers['Server-Timing'] = ', '.join([
+      f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_statements} queries"',
+      f'tpl;dur={g.template_seconds * 1000:.1f}',
+      f'total;dur={seconds * 1000:.1f}',
+    ])
+    if seconds * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+      current_app.logger.warning('slow request (%.0f ms, %d queries, %.0f ms SQL): %s %s',
+        seconds * 1000, g.sql_statements, g.sql_seconds * 1000, request.method, request.full_path)
+    return response
+
+  #  Export
+  #  ----------------------------------------------------------------
+
+  def render(self):
+    lines = []
+    with self.lock:
+      lines.append('# HELP fyyur_request_duration_seconds Request latency by endpoint.')
+      lines.append('# TYPE fyyur_request_duration_seconds histogram')
+      lines += self.request_duration.render('fyyur_request_duration_seconds', 'endpoint')
+      lines.append('# HELP fyyur_sql_statements_total SQL statements run by endpoint.')
+      lines.append('# TYPE fyyur_sql_statements_total counter')
+      lines += [f'fyyur_sql_statements_total{{endpoint="{endpoint}"}} {count}'
+                for endpoint, count in sorted(self.sql_statements.items())]
+      lines.append('# HELP fyyur_sql_duration_seconds_total Time spent in SQL statements by endpoint.')
+      lines.append('# TYPE fyyur_sql_duration_seconds_total counter')
+      lines += [f'fyyur_sql_duration_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}'
+                for endpoint, seconds in sorted(self.sql_seconds.items())]
+      lines.append('# HELP fyyur_template_duration_seconds Template render time by template.')
+      lines.append('# TYPE fyyur_template_duration_seconds histogram')
+      lines += self.template_duration.render('fyyur_template_duration_seconds', 'template')
+
+    page_cache = current_app.extensions.get('page_cache')
+    if page_cache is not None:
+      stats = page_cache.stats()
+      lines.append('# HELP fyyur_page_cache_requests_total Page cache lookups by result.')
+      lines.append('# TYPE fyyur_page_cache_requests_total counter')
+      lines.append(f'fyyur_page_cache_requests_total{{result="hit"}} {stats["hits"]}')
+      lines.append(f'fyyur_page_cache_requests_total{{result="miss"}} {stats["misses"]}')
+
+    fragments = current_app.extensions.get('fragments')
+    if fragments is not None:
+      stats = fragments.stats()
+      lines.append('# HELP fyyur_fragment_cache_requests_total Template fragment cache lookups by result.')
+      lines.append('# TYPE fyyur_fragment_cache_requests_total counter')
+      lines.append(f'fyyur_fragment_cache_requests_total{{result="hit"}} {stats["hits"]}')
+      lines.append(f'fyyur_fragment_cache_requests_total{{result="miss"}} {stats["misses"]}')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+metrics = Metrics()
@@ -0,0 +1,28 @@
+"""city indexes
+
+Revision ID: 10a4accd1273
+Revises: 5bb58ca0b9aa
+Create Date: 2026-10-18 20:05:51.730164
+
+Searches for a city without a state ("Seattle") cannot use the
+(state, city) indexes, give them their own.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '10a4accd1273'
+down_revision = '5bb58ca0b9aa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_city', 'Venue', ['city'], unique=False)
+    op.create_index('ix_Artist_city', 'Artist', ['city'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Artist_city', table_name='Artist')
+    op.drop_index('ix_Venue_city', table_name='Venue')
@@ -0,0 +1,40 @@
+"""updated_at columns
+
+Revision ID: 228fd9471db2
+Revises: 10a4accd1273
+Create Date: 2026-10-18 21:12:37.905314
+
+Venue, Artist and Show get an updated_at time (UTC), set by the models on
+insert and update. Postgres also defaults it in the database, for shows
+loaded with COPY. Existing rows start at the time of the upgrade.
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '228fd9471db2'
+down_revision = '10a4accd1273'
+branch_labels = None
+depends_on = None
+
+tables = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    now = datetime.utcnow()
+    for table in tables:
+        server_default = sa.text("timezone('utc', now())") if postgres else None
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True,
+                                       server_default=server_default))
+        op.execute(sa.table(table, sa.column('updated_at', sa.DateTime())).update().values(updated_at=now))
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(tables):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,95 @@
+"""genre tables
+
+Revision ID: 5bb58ca0b9aa
+Revises: 6dd97687e077
+Create Date: 2026-10-18 19:31:40.226518
+
+VenueGenre and ArtistGenre hold one row per genre of a venue/artist, for
+genre filters and facets. Triggers fill them from the genres column
+(a postgres ARRAY, JSON text on sqlite) on every insert and update, so
+bulk inserts and COPY keep them in sync too. Postgres removes the rows of
+deleted venues/artists through the foreign key cascade, sqlite (which
+does not enforce foreign keys here) through a delete trigger.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5bb58ca0b9aa'
+down_revision = '6dd97687e077'
+branch_labels = None
+depends_on = None
+
+tables = (('Venue', 'venue_id'), ('Artist', 'artist_id'))
+
+
+def create_triggers(dialect, table, column):
+    genres = f'{table}Genre'
+    if dialect == 'sqlite':
+        insert = f'''INSERT INTO "{genres}" (genre, {column})
+                SELECT DISTINCT value, new.id FROM json_each(new.genres) WHERE value IS NOT NULL;'''
+        op.execute(f'''CREATE TRIGGER "{genres}_ai" AFTER INSERT ON "{table}" BEGIN
+                {insert}
+                END''')
+        op.execute(f'''CREATE TRIGGER "{genres}_au" AFTER UPDATE OF genres ON "{table}" BEGIN
+                DELETE FROM "{genres}" WHERE {column} = old.id;
+                {insert}
+                END''')
+        op.execute(f'''CREATE TRIGGER "{genres}_ad" AFTER DELETE ON "{table}" BEGIN
+                DELETE FROM "{genres}" WHERE {column} = old.id;
+                END''')
+        op.execute(f'''INSERT INTO "{genres}" (genre, {column})
+                SELECT DISTINCT value, "{table}".id FROM "{table}", json_each("{table}".genres)
+                WHERE value IS NOT NULL''')
+    elif dialect == 'postgresql':
+        op.execute(f'''CREATE FUNCTION "{genres}_sync"() RETURNS trigger AS $$
+                BEGIN
+                  IF TG_OP = 'UPDATE' THEN
+                    DELETE FROM "{genres}" WHERE {column} = OLD.id;
+                  END IF;
+                  INSERT INTO "{genres}" (genre, {column})
+                    SELECT DISTINCT genre, NEW.id FROM unnest(NEW.genres) AS genre
+                    WHERE genre IS NOT NULL;
+                  RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql''')
+        op.execute(f'''CREATE TRIGGER "{genres}_sync" AFTER INSERT OR UPDATE OF genres ON "{table}"
+                FOR EACH ROW EXECUTE PROCEDURE "{genres}_sync"()''')
+        op.execute(f'''INSERT INTO "{genres}" (genre, {column})
+                SELECT DISTINCT genre, "{table}".id FROM "{table}", unnest("{table}".genres) AS genre
+                WHERE genre IS NOT NULL''')
+
+
+def drop_triggers(dialect, table):
+    genres = f'{table}Genre'
+    if dialect == 'sqlite':
+        for suffix in ('ai', 'au', 'ad'):
+            op.execute(f'DROP TRIGGER "{genres}_{suffix}"')
+    elif dialect == 'postgresql':
+        op.execute(f'DROP TRIGGER "{genres}_sync" ON "{table}"')
+        op.execute(f'DROP FUNCTION "{genres}_sync"()')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, column in tables:
+        op.create_table(f'{table}Genre',
+            sa.Column('genre', sa.String(length=120), nullable=False),
+            sa.Column(column, sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint([column], [f'{table}.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('genre', column)
+        )
+        op.create_index(f'ix_{table}Genre_{column}', f'{table}Genre', [column], unique=False)
+        op.create_index(f'ix_{table}_state_city', table, ['state', 'city'], unique=False)
+        create_triggers(dialect, table, column)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table, column in reversed(tables):
+        drop_triggers(dialect, table)
+        op.drop_index(f'ix_{table}_state_city', table_name=table)
+        op.drop_index(f'ix_{table}Genre_{column}', table_name=f'{table}Genre')
+        op.drop_table(f'{table}Genre')
@@ -0,0 +1,51 @@
+"""venue and artist show counters
+
+Revision ID: 6dd97687e077
+Revises: c12dd1c10def
+Create Date: 2026-10-18 19:02:13.408211
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6dd97687e077'
+down_revision = 'c12dd1c10def'
+branch_labels = None
+depends_on = None
+
+
+def backfill(table_name, show_column, now):
+    # same correlated UPDATE as counters.recount(), on table stubs
+    table = sa.table(table_name, sa.column('id'), sa.column('upcoming_shows_count'),
+                     sa.column('past_shows_count'), sa.column('next_show_time'))
+    show = sa.table('Show', sa.column(show_column), sa.column('time', sa.DateTime()))
+    own = show.c[show_column] == table.c.id
+    count = lambda criterion: sa.select(sa.func.count()).select_from(show).where(
+        own, criterion).scalar_subquery()
+    op.execute(table.update().values(
+        upcoming_shows_count=count(show.c.time > now),
+        past_shows_count=count(show.c.time <= now),
+        next_show_time=sa.select(sa.func.min(show.c.time)).where(
+            own, show.c.time > now).scalar_subquery(),
+    ))
+
+
+def upgrade():
+    now = datetime.now()
+    for table_name, show_column in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table_name, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table_name, sa.Column('past_shows_count', sa.Integer(), nullable=False, server_default='0'))
+        op.add_column(table_name, sa.Column('next_show_time', sa.DateTime(), nullable=True))
+        op.create_index(f'ix_{table_name}_next_show_time', table_name, ['next_show_time'], unique=False)
+        backfill(table_name, show_column, now)
+
+
+def downgrade():
+    for table_name in ('Artist', 'Venue'):
+        op.drop_index(f'ix_{table_name}_next_show_time', table_name=table_name)
+        op.drop_column(table_name, 'next_show_time')
+        op.drop_column(table_name, 'past_shows_count')
+        op.drop_column(table_name, 'upcoming_shows_count')
@@ -0,0 +1,42 @@
+"""jobs
+
+Revision ID: 8f6b2d41c7a3
+Revises: e3a1c9b04f52
+Create Date: 2026-10-19 00:52:07.403911
+
+Job rows record the status and progress of the background jobs run by
+jobs.py, such as large venue and artist deletes.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f6b2d41c7a3'
+down_revision = 'e3a1c9b04f52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('params', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('progress', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('message', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_Job_status', 'Job', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Job_status', table_name='Job')
+    op.drop_table('Job')
@@ -0,0 +1,62 @@
+"""name search indexes
+
+Revision ID: b7199a5d179b
+Revises: 5279fa1fd94e
+Create Date: 2026-10-18 10:03:17.554020
+
+Postgres gets pg_trgm GIN indexes on Venue.name and Artist.name, which
+serve the ILIKE '%term%' searches. SQLite gets external-content FTS5
+tables with the trigram tokenizer, kept in sync by triggers.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7199a5d179b'
+down_revision = '5279fa1fd94e'
+branch_labels = None
+depends_on = None
+
+tables = ('Venue', 'Artist')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for table in tables:
+        op.create_index(f'ix_{table}_name_trgm', table, ['name'],
+                        postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+
+    if dialect == 'sqlite':
+        for table in tables:
+            fts = f'{table}_fts'
+            op.execute(f'''CREATE VIRTUAL TABLE "{fts}" USING fts5(
+                name, content='{table}', content_rowid='id', tokenize='trigram')''')
+            op.execute(f'''CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN
+                INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name);
+                END''')
+            op.execute(f'''CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN
+                INSERT INTO "{fts}"("{fts}", rowid, name) VALUES ('delete', old.id, old.name);
+                END''')
+            op.execute(f'''CREATE TRIGGER "{fts}_au" AFTER UPDATE OF name ON "{table}" BEGIN
+                INSERT INTO "{fts}"("{fts}", rowid, name) VALUES ('delete', old.id, old.name);
+                INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name);
+                END''')
+            op.execute(f'''INSERT INTO "{fts}"("{fts}") VALUES ('rebuild')''')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table in tables:
+            fts = f'{table}_fts'
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER "{fts}_{suffix}"')
+            op.execute(f'DROP TABLE "{fts}"')
+
+    for table in tables:
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
@@ -0,0 +1,49 @@
+"""cascade show deletes
+
+Revision ID: c12dd1c10def
+Revises: f24fc7c0dfb9
+Create Date: 2026-10-18 13:40:52.117603
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c12dd1c10def'
+down_revision = 'f24fc7c0dfb9'
+branch_labels = None
+depends_on = None
+
+
+def show_table(ondelete):
+    return sa.Table('Show', sa.MetaData(),
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('artist_id', sa.Integer(), sa.ForeignKey('Artist.id', ondelete=ondelete), nullable=False),
+        sa.Column('venue_id', sa.Integer(), sa.ForeignKey('Venue.id', ondelete=ondelete), nullable=False),
+        sa.Column('time', sa.DateTime(), nullable=False),
+        sa.Index('ix_Show_venue_id_time', 'venue_id', 'time'),
+        sa.Index('ix_Show_artist_id_time', 'artist_id', 'time'),
+        sa.Index('ix_Show_time', 'time'),
+    )
+
+
+def set_ondelete(ondelete):
+    if op.get_bind().dialect.name == 'sqlite':
+        # sqlite cannot alter constraints, copy into a rebuilt table
+        with op.batch_alter_table('Show', recreate='always', copy_from=show_table(ondelete)):
+            pass
+        return
+
+    for column, referent in (('artist_id', 'Artist'), ('venue_id', 'Venue')):
+        name = f'Show_{column}_fkey'
+        op.drop_constraint(name, 'Show', type_='foreignkey')
+        op.create_foreign_key(name, 'Show', referent, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    set_ondelete('CASCADE')
+
+
+def downgrade():
+    set_ondelete(None)
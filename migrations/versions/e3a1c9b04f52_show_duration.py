@@ -0,0 +1,29 @@
+"""show duration
+
+Revision ID: e3a1c9b04f52
+Revises: 228fd9471db2
+Create Date: 2026-10-18 23:40:12.118204
+
+Shows get a length in minutes, so bookings can be checked for overlaps
+(see bookings.py). Existing shows, and shows inserted without one, last
+two hours.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a1c9b04f52'
+down_revision = '228fd9471db2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('duration', sa.Integer(), nullable=False,
+                                    server_default='120'))
+
+
+def downgrade():
+    op.drop_column('Show', 'duration')
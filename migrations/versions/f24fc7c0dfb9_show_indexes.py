@@ -0,0 +1,27 @@
+"""show foreign key and time indexes
+
+Revision ID: f24fc7c0dfb9
+Revises: b7199a5d179b
+Create Date: 2026-10-18 11:26:05.871934
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f24fc7c0dfb9'
+down_revision = 'b7199a5d179b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_time', 'Show', ['venue_id', 'time'], unique=False)
+    op.create_index('ix_Show_artist_id_time', 'Show', ['artist_id', 'time'], unique=False)
+    op.create_index('ix_Show_time', 'Show', ['time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_time', table_name='Show')
+    op.drop_index('ix_Show_artist_id_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_time', table_name='Show')
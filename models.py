@@ -1,24 +1,25 @@
-
-from flask import Flask
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from replicas import RoutingSession
 
 #----------------------------------------------------------------------------#
-# App Config.
+# Extensions, bound to the app by create_app() in app.py.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
+moment = Moment()
+# the session can read from replicas, see replicas.py
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
 
 #----------------------------------------------------------------------------#
 # Models.
-db = SQLAlchemy(app)
-migrate = Migrate(app,db)
 #----------------------------------------------------------------------------#
 
+# genres are a postgres ARRAY; sqlite has no arrays, so store JSON there
+GenreList = db.ARRAY(db.String()).with_variant(db.JSON(), 'sqlite')
+
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
@@ -29,14 +30,32 @@ class Venue(db.Model):
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     description = db.Column(db.String(500), default='')
+    # show counters kept up to date by counters.py, so listings never
+    # count the Show table
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime)
+    # UTC time of the last insert/update, for page versions (versions.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     # in oder to make relationship work, lazy must be 'dynamic'
-    shows = db.relationship('Show', backref='Venue', lazy='dynamic') 
+    # shows are removed by the ON DELETE CASCADE of their foreign key
+    shows = db.relationship('Show', backref='Venue', lazy='dynamic', passive_deletes=True)
+
+    # trigram index serving name searches, see search.py
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_next_show_time', 'next_show_time'),
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+        db.Index('ix_Venue_city', 'city'),
+        db.Index('ix_Venue_updated_at', 'updated_at'),
+    )
 
     def __repr__(self):
       return f'<Venue {self.id} name: {self.name}>'
@@ -49,24 +68,101 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String()))
+    genres = db.Column(GenreList)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(120), default=' ')
     website = db.Column(db.String(120))
-    shows = db.relationship('Show', backref='Artist', lazy='dynamic')
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    shows = db.relationship('Show', backref='Artist', lazy='dynamic', passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_next_show_time', 'next_show_time'),
+        db.Index('ix_Artist_state_city', 'state', 'city'),
+        db.Index('ix_Artist_city', 'city'),
+        db.Index('ix_Artist_updated_at', 'updated_at'),
+    )
     
     def __repr__(self):
       return f'<Artist {self.id} name: {self.name}>'
 
+# One row per genre of a venue/artist, for genre filters and facets (see
+# facets.py). Filled from the genres column by database triggers, created
+# by the genre_tables migration, so every insert path keeps them in sync.
+
+class VenueGenre(db.Model):
+    __tablename__ = 'VenueGenre'
+
+    genre = db.Column(db.String(120), primary_key=True)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'),
+                         primary_key=True, index=True)
+
+    def __repr__(self):
+      return f'<VenueGenre {self.venue_id} {self.genre}>'
+
+class ArtistGenre(db.Model):
+    __tablename__ = 'ArtistGenre'
+
+    genre = db.Column(db.String(120), primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'),
+                          primary_key=True, index=True)
+
+    def __repr__(self):
+      return f'<ArtistGenre {self.artist_id} {self.genre}>'
+
 class Show(db.Model):
     __tablename__ = 'Show'
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
     time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # length in minutes, see bookings.py
+    duration = db.Column(db.Integer, nullable=False, default=120, server_default='120')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # venue/artist pages filter on the foreign key and compare time,
+    # the /shows feed orders by time alone.
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_time', 'venue_id', 'time'),
+        db.Index('ix_Show_artist_id_time', 'artist_id', 'time'),
+        db.Index('ix_Show_time', 'time'),
+        db.Index('ix_Show_updated_at', 'updated_at'),
+    )
+
+    def __repr__(self):
+      return f'<Show {self.id}, Artist {self.artist_id}, Venue {self.venue_id}>'
+
+def show_sides(model):
+    """(Show column of `model`, the model on the other side of its shows,
+    that model's Show column) for Venue or Artist."""
+    if model is Venue:
+        return Show.venue_id, Artist, Show.artist_id
+    return Show.artist_id, Venue, Show.venue_id
+
+# Background jobs, see jobs.py. A job is queued, then running, and ends
+# succeeded or failed; a failed attempt with retries left is queued again.
+
+class Job(db.Model):
+    __tablename__ = 'Job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
 
     def __repr__(self):
-      return f'<Show {self.id}, Artist {self.artist_id}, Venue {self.venue_id}>'
\ No newline at end of file
+      return f'<Job {self.id} {self.kind} {self.status}>'
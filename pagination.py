@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+
+#----------------------------------------------------------------------------#
+# Keyset (seek) pagination cursors.
+#----------------------------------------------------------------------------#
+# A cursor marks the last row of a page by its (time, id) sort key, so the
+# next page is fetched with "WHERE (time, id) < (:time, :id) LIMIT n" instead
+# of an OFFSET that grows with the page number.
+
+def page_count(count, per_page):
+  # pages of numbered (OFFSET) pagination, as for the search results
+  return -(-count // per_page)
+
+def encode_cursor(time, id):
+  raw = f'{time.isoformat()}|{id}'.encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+  # returns (time, id), raises ValueError on a malformed cursor
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    time, id = base64.urlsafe_b64decode(padded).decode().split('|')
+    return datetime.fromisoformat(time), int(id)
+  except (TypeError, UnicodeDecodeError, ValueError) as e:
+    raise ValueError(f'invalid cursor: {cursor!r}') from e
+
+def encode_id_cursor(id):
+  # cursor of lists sorted by id alone
+  return base64.urlsafe_b64encode(str(id).encode()).decode().rstrip('=')
+
+def decode_id_cursor(cursor):
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return int(base64.urlsafe_b64decode(padded).decode())
+  except (TypeError, UnicodeDecodeError, ValueError) as e:
+    raise ValueError(f'invalid cursor: {cursor!r}') from e
@@ -0,0 +1,148 @@
+import itertools
+import threading
+import time
+from flask import request, session, current_app
+from flask_sqlalchemy.session import Session
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+# Each of REPLICA_URLS becomes an SQLAlchemy bind ('replica0', 'replica1',
+# ...). A GET or HEAD request, or a view marked @read_only, picks one of
+# them in turn and its session reads from it. Everything else stays on the
+# primary:
+#
+#   - requests with other methods (create, edit and delete handlers),
+#   - any INSERT, UPDATE or DELETE and everything run during a flush,
+#   - reads of a user who wrote in the last REPLICA_MAX_LAG seconds, so
+#     they see their own changes: writing requests set a sticky
+#     'primary_until' time in their session cookie,
+#   - reads while every replica lags more than REPLICA_MAX_LAG seconds
+#     behind the primary. Lag is measured on postgres replicas every
+#     REPLICA_LAG_CHECK_INTERVAL seconds. A replica failing the check is
+#     skipped until the next one. Other databases are taken as current.
+#
+# Views running in a replica session must not write through
+# session.connection(), which has no statement to route on.
+#
+# Pages cached from replica reads are keyed on the page version read in
+# the same session (see cache.py), so a writer reading the primary never
+# gets the stale page a lagging replica rendered for someone else.
+
+class RoutingSession(Session):
+  """Session reading from the bind named in info['replica'], if any."""
+
+  def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+    replica = self.info.get('replica')
+    if (bind is None and replica is not None and not self._flushing
+        and not getattr(clause, 'is_dml', False)):
+      return self._db.engines[replica]
+    return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def read_only(view):
+  """Mark a view with an unsafe method (a POST search form) as a read."""
+  view.read_only = True
+  return view
+
+# seconds since the last transaction replayed on a postgres replica; 0
+# when it has replayed everything it received
+lag_query = '''
+  SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+'''
+
+class Replicas(object):
+
+  def __init__(self, app=None):
+    self.lock = threading.Lock()
+    self.keys = []
+    self.turns = None
+    self.lags = {}
+    self.checked = float('-inf')
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    """Add the replica binds. Call it before db.init_app(), which creates
+    the engines."""
+    app.config.setdefault('REPLICA_URLS', [])
+    app.config.setdefault('REPLICA_MAX_LAG', 5)
+    app.config.setdefault('REPLICA_LAG_CHECK_INTERVAL', 10)
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    self.keys = []
+    for i, url in enumerate(app.config['REPLICA_URLS']):
+      binds[f'replica{i}'] = url
+      self.keys.append(f'replica{i}')
+    app.config['SQLALCHEMY_BINDS'] = binds
+    self.turns = itertools.cycle(self.keys)
+    if self.keys:
+      app.before_request(self.route_request)
+      app.after_request(self.stick_to_primary)
+      app.teardown_request(self.end_request)
+    app.extensions['replicas'] = self
+
+  #  Routing
+  #  ----------------------------------------------------------------
+
+  def is_read(self):
+    view = current_app.view_functions.get(request.endpoint)
+    return request.method in ('GET', 'HEAD') or getattr(view, 'read_only', False)
+
+  def route_request(self):
+    if not self.is_read() or session.get('primary_until', 0) > time.time():
+      return
+    replica = self.choose()
+    if replica is not None:
+      current_app.extensions['sqlalchemy'].session.info['replica'] = replica
+
+  def end_request(self, exception=None):
+    # a session outliving the request (one app context for several
+    # requests) reads from the primary again
+    current_app.extensions['sqlalchemy'].session.info.pop('replica', None)
+
+  def stick_to_primary(self, response):
+    if not self.is_read():
+      session['primary_until'] = time.time() + current_app.config['REPLICA_MAX_LAG']
+    return response
+
+  def choose(self):
+    # the next replica in turn that is not lagging, or None for the primary
+    lags = self.current_lags()
+    max_lag = current_app.config['REPLICA_MAX_LAG']
+    with self.lock:
+      for i in range(len(self.keys)):
+        key = next(self.turns)
+        if lags.get(key, 0) <= max_lag:
+          return key
+    return None
+
+  #  Lag
+  #  ----------------------------------------------------------------
+
+  def current_lags(self):
+    interval = current_app.config['REPLICA_LAG_CHECK_INTERVAL']
+    if time.monotonic() - self.checked >= interval:
+      with self.lock:
+        if time.monotonic() - self.checked >= interval:
+          self.checked = time.monotonic()
+          self.lags = self.measure()
+    return self.lags
+
+  def measure(self):
+    """{bind key: seconds behind the primary} of the replicas;
+    unreachable replicas count as infinitely far behind."""
+    engines = current_app.extensions['sqlalchemy'].engines
+    lags = {}
+    for key in self.keys:
+      engine = engines[key]
+      if engine.dialect.name != 'postgresql':
+        continue
+      try:
+        with engine.connect() as connection:
+          lags[key] = float(connection.exec_driver_sql(lag_query).scalar())
+      except Exception:
+        current_app.logger.exception('replica %s failed its lag check', key)
+        lags[key] = float('inf')
+    return lags
+
+replicas = Replicas()
@@ -0,0 +1,128 @@
+import re
+from flask import current_app
+from models import db, Venue, Artist, VenueGenre, ArtistGenre
+from forms import genre_choices, state_choices
+
+#----------------------------------------------------------------------------#
+# Name search.
+#----------------------------------------------------------------------------#
+# Venue and Artist names are searched by case-insensitive substring.
+#
+# postgres: ILIKE '%term%' served by the pg_trgm GIN index, ranked by
+#           trigram similarity to the search term.
+# sqlite:   the FTS5 trigram tables created by the migrations, ranked by
+#           bm25. Terms shorter than a trigram fall back to LIKE.
+#
+# Each search is a single query: the total number of matches comes back on
+# every row through a COUNT(*) OVER () window, next to one page of results.
+#
+# search() looks for venues and artists at once. Besides names, a term can
+# be a genre ("jazz"), a city ("Seattle"), a state ("WA") or both
+# ("Seattle, WA"), each answered by an index: the VenueGenre/ArtistGenre
+# primary keys, the city and (state, city) indexes. Every row is scored by
+# what it matched (name 3, genre 2, city 2, state 1); the rows of both
+# models are merged under UNION ALL and ranked by score, then name.
+
+def escape_like(term):
+  return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_names(model, term, page=1, per_page=None):
+  """Return (rows, total) for one page of `model` rows whose name contains
+  `term`. Rows have `id` and `name` attributes."""
+  per_page = per_page or current_app.config['SEARCH_RESULTS_PER_PAGE']
+  term = term.strip()
+  total = db.func.count().over().label('total')
+  query = db.session.query(model.id, model.name, total)
+
+  dialect = db.session.get_bind().dialect.name
+  if not term:
+    query = query.order_by(model.name, model.id)
+  elif dialect == 'sqlite' and len(term) >= 3:
+    fts_name = f'{model.__tablename__}_fts'
+    fts = db.table(fts_name, db.column('rowid'), db.column('rank'))
+    query = query.join(fts, fts.c.rowid == model.id
+      ).filter(db.literal_column(f'"{fts_name}"').match('"' + term.replace('"', '""') + '"')
+      ).order_by(fts.c.rank, model.id)
+  else:
+    query = query.filter(model.name.ilike(f'%{escape_like(term)}%', escape='\\'))
+    if dialect == 'postgresql':
+      query = query.order_by(db.func.similarity(model.name, term).desc(), model.id)
+    else:
+      query = query.order_by(model.name, model.id)
+
+  rows = query.limit(per_page).offset((page - 1) * per_page).all()
+  return rows, (rows[0].total if rows else 0)
+
+genres = {genre.casefold(): genre for genre, label in genre_choices}
+states = {state for state, label in state_choices}
+location = re.compile(r'^(.+?),\s*([A-Za-z]{2})$')
+
+searched = {
+  'venue': (Venue, VenueGenre, VenueGenre.venue_id),
+  'artist': (Artist, ArtistGenre, ArtistGenre.artist_id),
+}
+
+def parse_term(term):
+  """The genre, city and state a search term can stand for, or None."""
+  genre = genres.get(term.casefold())
+  city = state = None
+  match = location.match(term)
+  if match and match.group(2).upper() in states:
+    city, state = match.group(1).strip(), match.group(2).upper()
+  elif term.upper() in states:
+    state = term.upper()
+  else:
+    city = term
+  return genre, city, state
+
+def name_match(model, term, dialect):
+  if dialect == 'sqlite' and len(term) >= 3:
+    fts_name = f'{model.__tablename__}_fts'
+    fts = db.table(fts_name, db.column('rowid'))
+    return model.id.in_(db.select(fts.c.rowid).where(
+      db.literal_column(f'"{fts_name}"').match('"' + term.replace('"', '""') + '"')))
+  return model.name.ilike(f'%{escape_like(term)}%', escape='\\')
+
+def entity_search(kind, term, dialect):
+  # SELECT of one model's matches with their score
+  model, genre_table, owner = searched[kind]
+  if not term:
+    # an empty search lists everything, by name
+    return db.select(
+        db.literal(kind).label('kind'), model.id.label('id'), model.name.label('name'),
+        model.city.label('city'), model.state.label('state'),
+        db.literal(0).label('score'), db.literal(0.0).label('similarity'))
+
+  genre, city, state = parse_term(term)
+  scores = [(name_match(model, term, dialect), 3)]
+  if genre:
+    scores.append((model.id.in_(db.select(owner).where(genre_table.genre == genre)), 2))
+  if city:
+    # cities are stored as entered, try the usual capitalisation too
+    city_match = model.city.in_({city, city.title()})
+    scores.append((db.and_(city_match, model.state == state) if state else city_match, 2))
+  if state:
+    scores.append((model.state == state, 1))
+
+  score = sum(db.case((condition, points), else_=0) for condition, points in scores)
+  similarity = db.func.similarity(model.name, term) if dialect == 'postgresql' else db.literal(0.0)
+  return db.select(
+      db.literal(kind).label('kind'), model.id.label('id'), model.name.label('name'),
+      model.city.label('city'), model.state.label('state'),
+      score.label('score'), similarity.label('similarity')
+    ).where(db.or_(*[condition for condition, points in scores]))
+
+def search(term, kinds=('venue', 'artist'), page=1, per_page=None):
+  """Return (rows, total) for one page of the venues and/or artists
+  matching `term` by name, genre, city or state, best matches first (all
+  of them for an empty term). Rows
+  have kind, id, name, city, state and score attributes."""
+  per_page = per_page or current_app.config['SEARCH_RESULTS_PER_PAGE']
+  term = ' '.join(term.split())
+  dialect = db.session.get_bind().dialect.name
+  selects = [entity_search(kind, term, dialect) for kind in kinds]
+  matches = (db.union_all(*selects) if len(selects) > 1 else selects[0]).subquery()
+  query = db.select(matches, db.func.count().over().label('total')).order_by(
+    matches.c.score.desc(), matches.c.similarity.desc(), matches.c.name, matches.c.kind, matches.c.id)
+  rows = db.session.execute(query.limit(per_page).offset((page - 1) * per_page)).all()
+  return rows, (rows[0].total if rows else 0)
@@ -0,0 +1,87 @@
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+from models import db, Venue, Artist, Show
+from forms import genre_choices
+import counters
+
+#----------------------------------------------------------------------------#
+# Sample data.
+#----------------------------------------------------------------------------#
+# Generated catalogues are skewed the way real ones are: a few cities hold
+# most venues and artists, and a few venues and artists play most shows
+# (Zipf-like weights). Most shows are in the past, the rest spread over the
+# coming year.
+
+cities = [
+  ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+  ('Phoenix', 'AZ'), ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('San Diego', 'CA'),
+  ('Dallas', 'TX'), ('Austin', 'TX'), ('San Francisco', 'CA'), ('Seattle', 'WA'),
+  ('Denver', 'CO'), ('Nashville', 'TN'), ('Portland', 'OR'), ('New Orleans', 'LA'),
+  ('Boston', 'MA'), ('Detroit', 'MI'), ('Memphis', 'TN'), ('Atlanta', 'GA'),
+]
+genres = [genre for genre, label in genre_choices]
+name_words = [
+  'Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Silver', 'Crimson', 'Wild',
+  'Lonesome', 'Neon', 'Hollow', 'Rusty', 'Painted', 'Broken', 'Lucky', 'Gypsy',
+]
+venue_words = ['Hall', 'Lounge', 'Tavern', 'Room', 'Theatre', 'Club', 'Garden', 'Cellar']
+artist_words = ['Band', 'Quartet', 'Collective', 'Brothers', 'Orchestra', 'Trio', 'Kings', 'Riders']
+
+def zipf_weights(n, s=1.1):
+  # cumulative weights for rng.choices, rank 1 is the most popular
+  return list(accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+def make_name(rng, words, i):
+  return f'The {rng.choice(name_words)} {rng.choice(name_words)} {rng.choice(words)} {i}'
+
+def seed(venues=10, artists=10, shows=100, seed=0, past_fraction=0.7, chunk_size=10000):
+  """Insert `venues` venues, `artists` artists and `shows` shows. A
+  `past_fraction` of the shows lies in the past three years, the others in
+  the coming year. The same `seed` always generates the same data."""
+  rng = random.Random(seed)
+  now = datetime.now().replace(second=0, microsecond=0)
+  city_weights = zipf_weights(len(cities))
+
+  def entities(model, count, words, extra):
+    rows = []
+    for i in range(count):
+      city, state = rng.choices(cities, cum_weights=city_weights)[0]
+      rows.append(dict(name=make_name(rng, words, i), city=city, state=state,
+                       genres=rng.sample(genres, rng.randint(1, 3)),
+                       phone=f'{rng.randint(200, 999)}-555-{rng.randint(0, 9999):04d}', **extra()))
+    for start in range(0, len(rows), chunk_size):
+      db.session.execute(model.__table__.insert(), rows[start:start + chunk_size])
+    # ids of the rows just inserted, shuffled so that popularity (the
+    # position in the list) does not follow insertion order
+    ids = [id for id, in db.session.query(model.id).order_by(model.id.desc()).limit(count)]
+    ids.reverse()
+    rng.shuffle(ids)
+    return ids
+
+  venue_ids = entities(Venue, venues, venue_words, lambda: dict(
+    address=f'{rng.randint(1, 999)} Main St', seeking_talent=False, description=''))
+  artist_ids = entities(Artist, artists, artist_words, lambda: dict(
+    seeking_venue=False, seeking_description=''))
+
+  venue_weights = zipf_weights(len(venue_ids))
+  artist_weights = zipf_weights(len(artist_ids))
+  rows = []
+  for i in range(shows):
+    if rng.random() < past_fraction:
+      minutes = -rng.randint(1, 3 * 525600)
+    else:
+      minutes = rng.randint(1, 525600)
+    rows.append(dict(
+      venue_id=rng.choices(venue_ids, cum_weights=venue_weights)[0],
+      artist_id=rng.choices(artist_ids, cum_weights=artist_weights)[0],
+      time=now + timedelta(minutes=minutes)
+    ))
+    if len(rows) == chunk_size:
+      db.session.execute(Show.__table__.insert(), rows)
+      counters.add_shows(rows, now)
+      rows = []
+  if rows:
+    db.session.execute(Show.__table__.insert(), rows)
+    counters.add_shows(rows, now)
+  db.session.commit()
@@ -0,0 +1,115 @@
+from datetime import datetime
+
+#----------------------------------------------------------------------------#
+# Serializers.
+#----------------------------------------------------------------------------#
+# The dicts the pages render and the JSON API returns are built here, so
+# both always carry the same fields under the same names. Times stay
+# datetimes for the templates' datetime filter; jsonable() turns them into
+# ISO 8601 strings for the API.
+
+venue_fields = ('id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+                'facebook_link', 'seeking_talent', 'seeking_description', 'image_link',
+                'upcoming_shows_count', 'past_shows_count')
+
+artist_fields = ('id', 'name', 'genres', 'city', 'state', 'phone', 'website',
+                 'facebook_link', 'seeking_venue', 'seeking_description', 'image_link',
+                 'upcoming_shows_count', 'past_shows_count')
+
+show_fields = ('id', 'venue_id', 'venue_name', 'artist_id', 'artist_name',
+               'artist_image_link', 'start_time')
+
+def venue_dict(venue):
+  return {
+    "id": venue.id,
+    "name": venue.name,
+    "genres": venue.genres,
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": venue.website,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.description,
+    "image_link": venue.image_link,
+    "upcoming_shows_count": venue.upcoming_shows_count,
+    "past_shows_count": venue.past_shows_count
+  }
+
+def artist_dict(artist):
+  return {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": artist.genres,
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.website,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    "upcoming_shows_count": artist.upcoming_shows_count,
+    "past_shows_count": artist.past_shows_count
+  }
+
+def show_tile(prefix, id, name, image_link, time):
+  # a show on a venue page (prefix 'artist') or artist page (prefix 'venue')
+  return {
+    f"{prefix}_id": id,
+    f"{prefix}_name": name,
+    f"{prefix}_image_link": image_link,
+    "start_time": time
+  }
+
+def show_dict(id, time, venue_id, venue_name, artist_id, artist_name, artist_image_link):
+  # a show of the /shows feed
+  return {
+    "id": id,
+    "venue_id": venue_id,
+    "venue_name": venue_name,
+    "artist_id": artist_id,
+    "artist_name": artist_name,
+    "artist_image_link": artist_image_link,
+    "start_time": time
+  }
+
+def job_dict(job):
+  return {
+    "id": job.id,
+    "kind": job.kind,
+    "status": job.status,
+    "progress": job.progress,
+    "total": job.total,
+    "attempts": job.attempts,
+    "message": job.message,
+    "created_at": job.created_at,
+    "started_at": job.started_at,
+    "finished_at": job.finished_at
+  }
+
+def parse_fields(value, allowed):
+  """The field names of a comma separated ?fields= value, or None for all
+  fields. Raises ValueError on an unknown name."""
+  if not value:
+    return None
+  fields = [field.strip() for field in value.split(',') if field.strip()]
+  unknown = [field for field in fields if field not in allowed]
+  if unknown:
+    raise ValueError(f'unknown fields: {", ".join(unknown)}')
+  return fields
+
+def select_fields(data, fields):
+  if fields is None:
+    return data
+  return {field: data[field] for field in fields if field in data}
+
+def jsonable(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  if isinstance(value, dict):
+    return {key: jsonable(item) for key, item in value.items()}
+  if isinstance(value, (list, tuple)):
+    return [jsonable(item) for item in value]
+  return value
@@ -2,3 +2,37 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// replace a "Load more" button with the next page of show tiles
+window.loadMoreShows = function loadMoreShows(e) {
+  var button = e.target;
+  button.disabled = true;
+  fetch(button.dataset.url)
+    .then(function(response) { return response.text(); })
+    .then(function(html) { button.parentElement.outerHTML = html; })
+    .catch(function(error) {
+      button.disabled = false;
+      console.log(error);
+    });
+};
+
+// fill the datalist of a search box with the names /api/suggest returns
+document.addEventListener('input', function(e) {
+  var input = e.target;
+  if (!input.dataset || !input.dataset.suggest) return;
+  var q = input.value.trim();
+  if (q.length < 2) return;
+  fetch('/api/suggest?q=' + encodeURIComponent(q))
+    .then(function(response) { return response.json(); })
+    .then(function(data) {
+      if (input.value.trim() !== q) return;
+      var list = document.getElementById(input.getAttribute('list'));
+      list.innerHTML = '';
+      data[input.dataset.suggest].forEach(function(item) {
+        var option = document.createElement('option');
+        option.value = item.name;
+        list.appendChild(option);
+      });
+    })
+    .catch(function(error) { console.log(error); });
+});
@@ -0,0 +1,235 @@
+import bisect
+import os
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Venue, Artist
+from search import search_names
+
+#----------------------------------------------------------------------------#
+# Name suggestions.
+#----------------------------------------------------------------------------#
+# /api/suggest completes a venue or artist name from its first letters, or
+# from the first letters of any of its first few words ("vel" finds "The
+# Blue Velvet Hall"). Names are kept in memory as one sorted list of
+# (key, kind, id) tuples, so a lookup is a bisect to the first key with the
+# prefix and a short scan from there.
+#
+# The index is built from the database at startup and rebuilt on a
+# background thread, one at a time, once it is SUGGEST_MAX_AGE seconds old,
+# which also picks up writes made by other processes. Writes through this
+# process's session update it as they commit, see listen(). Until the
+# first build is done, and past SUGGEST_MAX_NAMES names, where the index
+# stops growing, lookups fall back to search_names().
+
+kinds = {'venue': Venue, 'artist': Artist}
+
+word_keys = 4     # index a name under its first 4 word starts
+key_length = 48   # characters of each key kept
+
+def keys_for(name):
+  words = (name or '').casefold().split()
+  keys = {' '.join(words[i:])[:key_length] for i in range(min(len(words), word_keys))}
+  return sorted(keys)
+
+class PrefixIndex(object):
+
+  def __init__(self, max_names):
+    self.max_names = max_names
+    self.items = []   # sorted (key, kind, id)
+    self.names = {}   # (kind, id) -> name
+    self.complete = True
+
+  def build(self, rows):
+    """Fill the index from (kind, id, name) rows."""
+    for kind, id, name in rows:
+      if len(self.names) >= self.max_names:
+        self.complete = False
+        break
+      self.names[(kind, id)] = name
+      self.items.extend((key, kind, id) for key in keys_for(name))
+    self.items.sort()
+
+  def add(self, kind, id, name):
+    self.remove(kind, id)
+    if len(self.names) >= self.max_names:
+      self.complete = False
+      return
+    self.names[(kind, id)] = name
+    for key in keys_for(name):
+      bisect.insort(self.items, (key, kind, id))
+
+  def remove(self, kind, id):
+    name = self.names.pop((kind, id), None)
+    if name is None:
+      return
+    for key in keys_for(name):
+      i = bisect.bisect_left(self.items, (key, kind, id))
+      if i < len(self.items) and self.items[i] == (key, kind, id):
+        del self.items[i]
+
+  def lookup(self, prefix, limit):
+    """{kind: [(id, name)]} of at most `limit` names per kind with a key
+    starting with `prefix`, in key order."""
+    prefix = ' '.join(prefix.casefold().split())[:key_length]
+    found = {kind: {} for kind in kinds}
+    i = bisect.bisect_left(self.items, (prefix,))
+    # a one-letter prefix can match most of the index, scan a bounded range
+    for key, kind, id in self.items[i:i + limit * 50]:
+      if not key.startswith(prefix):
+        break
+      if len(found[kind]) < limit:
+        found[kind].setdefault(id, self.names[(kind, id)])
+      elif all(len(ids) >= limit for ids in found.values()):
+        break
+    return {kind: list(ids.items()) for kind, ids in found.items()}
+
+class Suggestions(object):
+
+  def __init__(self, app=None):
+    self.lock = threading.Lock()
+    self.index = None
+    self.built_at = float('-inf')
+    self.building = False
+    self.journal = None   # changes made while a build reads, see rebuild()
+    self.hooked = False
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('SUGGEST_LIMIT', 8)
+    app.config.setdefault('SUGGEST_MAX_NAMES', 500000)
+    app.config.setdefault('SUGGEST_MAX_AGE', 600)
+    app.extensions['suggestions'] = self
+
+    # once per process: a build thread does not survive fork(), so a
+    # child must not wait for it
+    if not self.hooked:
+      self.hooked = True
+      if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=self.reset)
+
+    # built at startup, unless the tables are not there yet (a database
+    # still to be migrated) or the database cannot be reached: then the
+    # first lookup builds it in the background
+    with app.app_context():
+      try:
+        ready = inspect(db.engine).has_table(Venue.__tablename__)
+      except SQLAlchemyError as e:
+        app.logger.warning('Name suggestions not built at startup: %s', e)
+        ready = False
+    if ready:
+      self.build(app)
+
+  def reset(self):
+    self.lock = threading.Lock()
+    self.building = False
+    self.journal = None
+
+  def start(self):
+    # True for the one caller that gets to build
+    with self.lock:
+      if self.building:
+        return False
+      self.building = True
+      self.journal = []
+      return True
+
+  def build(self, app=None):
+    """Build the index here and now, unless a build is already running."""
+    if self.start():
+      self.rebuild(app or current_app._get_current_object())
+
+  def rebuild(self, app):
+    # Reads every name into a new index and swaps it in. The index in use
+    # keeps serving lookups meanwhile; changes applied to it while the
+    # names are read are recorded and replayed onto the new one before the
+    # swap. Called by whoever start() let build.
+    try:
+      with app.app_context():
+        rows = []
+        for kind, model in kinds.items():
+          rows += [(kind, id, name) for id, name in db.session.query(model.id, model.name)]
+      index = PrefixIndex(app.config['SUGGEST_MAX_NAMES'])
+      index.build(rows)
+      with self.lock:
+        for change, *args in self.journal:
+          getattr(index, change)(*args)
+        self.index = index
+        self.built_at = time.monotonic()
+    except SQLAlchemyError:
+      # tried again once SUGGEST_MAX_AGE has passed, not by every lookup
+      app.logger.exception('Building the name suggestions failed')
+      self.built_at = time.monotonic()
+    finally:
+      with self.lock:
+        self.building = False
+        self.journal = None
+
+  def refresh(self):
+    """Rebuild the index on a thread of its own, unless a build is already
+    running."""
+    if self.start():
+      thread = threading.Thread(target=self.rebuild, args=(current_app._get_current_object(),),
+                                name='suggest-build', daemon=True)
+      thread.start()
+      return thread
+
+  def current(self):
+    if time.monotonic() - self.built_at > current_app.config['SUGGEST_MAX_AGE']:
+      self.refresh()
+    return self.index
+
+  def lookup(self, prefix, limit=None):
+    limit = limit or current_app.config['SUGGEST_LIMIT']
+    index = self.current()
+    if index is not None and index.complete:
+      with self.lock:
+        return index.lookup(prefix, limit)
+    return {kind: [(row.id, row.name) for row in search_names(model, prefix, 1, limit)[0]]
+            for kind, model in kinds.items()}
+
+  def add(self, kind, id, name):
+    self.apply('add', kind, id, name)
+
+  def remove(self, kind, id):
+    self.apply('remove', kind, id)
+
+  def apply(self, change, *args):
+    with self.lock:
+      if self.journal is not None:
+        self.journal.append((change, *args))
+      if self.index is not None:
+        getattr(self.index, change)(*args)
+
+  def listen(self, session):
+    """Collect the venues and artists added, renamed or deleted by each
+    flush and apply them to the index once the transaction commits."""
+
+    def pending(sess):
+      return sess.info.setdefault('suggest_changes', [])
+
+    @event.listens_for(session, 'after_flush')
+    def collect(sess, flush_context):
+      changes = pending(sess)
+      for obj in list(sess.new) + list(sess.dirty) + list(sess.deleted):
+        kind = type(obj).__name__.lower()
+        if kind not in kinds:
+          continue
+        if obj in sess.deleted:
+          changes.append((self.remove, kind, obj.id))
+        elif obj in sess.new or inspect(obj).attrs.name.history.has_changes():
+          changes.append((self.add, kind, obj.id, obj.name))
+
+    @event.listens_for(session, 'after_commit')
+    def apply(sess):
+      for change, *args in sess.info.pop('suggest_changes', []):
+        change(*args)
+
+    @event.listens_for(session, 'after_soft_rollback')
+    def discard(sess, previous_transaction):
+      sess.info.pop('suggest_changes', None)
+
+suggestions = Suggestions()
@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+
+#----------------------------------------------------------------------------#
+# Test setup.
+#----------------------------------------------------------------------------#
+# The tests run the app of app.py with the 'sqlite' profile against a
+# scratch database file, migrated once per session. The same file is also
+# its read replica, one without lag, so GET requests go through the
+# replica routing of replicas.py. app.py builds its app on import, so the
+# environment is set before that.
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+directory = tempfile.mkdtemp(prefix='fyyur-tests-')
+os.environ['FYYUR_CONFIG'] = 'sqlite'
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'fyyur.db')
+os.environ['REPLICA_URLS'] = os.environ['DATABASE_URL']
+
+from flask_migrate import upgrade
+from app import app as fyyur_app
+from models import db, Venue, Artist, Show, Job
+from cache import page_cache
+from fragments import fragments
+from calendars import feeds
+from logs import logs, output_handler
+
+@pytest.fixture(scope='session')
+def app():
+  fyyur_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, TEMPLATE_WARMUP=False)
+  # log to stderr, where pytest captures it, instead of error.log
+  logs.install(fyyur_app, [output_handler()], queued=False)
+  with fyyur_app.app_context():
+    upgrade(directory=os.path.join(root, 'migrations'))
+  return fyyur_app
+
+@pytest.fixture
+def database(app):
+  """An app context on an empty database, emptied again afterwards."""
+  with app.app_context():
+    yield db
+    db.session.rollback()
+    for model in (Show, Venue, Artist, Job):
+      db.session.query(model).delete()
+    db.session.commit()
+  page_cache.backend.clear()
+  fragments.clear()
+  feeds.cache.clear()
+
+@pytest.fixture
+def client(app, database):
+  return app.test_client()
+
+@pytest.fixture
+def statements(app):
+  """statements() is a context manager collecting the SQL statements run
+  on the primary and the replica inside it."""
+  @contextmanager
+  def collect():
+    found = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+      found.append(statement)
+    with app.app_context():
+      engines = set(db.engines.values())
+    for engine in engines:
+      event.listen(engine, 'before_cursor_execute', record)
+    try:
+      yield found
+    finally:
+      for engine in engines:
+        event.remove(engine, 'before_cursor_execute', record)
+  return collect
@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+import counters
+from models import db, Venue, Artist, Show
+
+def test_show_counts_that_went_stale_are_recounted(client):
+  venue = Venue(name='The Hall', city='Austin', state='TX', genres=['Jazz'])
+  artist = Artist(name='The Band', city='Austin', state='TX', genres=['Jazz'])
+  db.session.add_all([venue, artist])
+  db.session.flush()
+  # a show that started a minute ago, counted as upcoming before it did
+  now = datetime.now()
+  rows = [{'venue_id': venue.id, 'artist_id': artist.id, 'time': now - timedelta(minutes=1)}]
+  db.session.execute(Show.__table__.insert(), rows)
+  counters.add_shows(rows, now - timedelta(minutes=2))
+  db.session.commit()
+
+  for url in (f'/api/v1/venues/{venue.id}', f'/api/v1/venues/{venue.id}?fields=upcoming_shows_count,past_shows_count'):
+    data = client.get(url).get_json()
+    assert (data['upcoming_shows_count'], data['past_shows_count']) == (0, 1)
+  data = client.get('/api/v1/venues').get_json()['data'][0]
+  assert (data['upcoming_shows_count'], data['past_shows_count']) == (0, 1)
@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+from models import db, Venue, Artist, Show
+
+def test_show_times_with_a_utc_offset_are_stored_as_local_times(client):
+  venue = Venue(name='The Hall', city='Austin', state='TX')
+  artist = Artist(name='The Band', city='Austin', state='TX')
+  db.session.add_all([venue, artist])
+  db.session.commit()
+
+  response = client.post('/shows/create', data={
+    'venue_id': venue.id, 'artist_id': artist.id, 'start_time': '2030-01-01T20:00:00+02:00'})
+  assert response.status_code == 200
+  show = db.session.query(Show).one()
+  expected = datetime(2030, 1, 1, 18, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+  assert show.time == expected
+
+def test_unreadable_show_times_are_reported_to_the_user(client):
+  response = client.post('/shows/create', data={'venue_id': 1, 'artist_id': 1, 'start_time': 'soon'})
+  assert response.status_code == 200
+  assert b'Show could not be added' in response.data
+
+def venue_and_artist():
+  venue = Venue(name='The Hall', city='Austin', state='TX', genres=['Jazz'])
+  artist = Artist(name='The Band', city='Austin', state='TX', genres=['Jazz'])
+  db.session.add_all([venue, artist])
+  db.session.commit()
+  return venue.id, artist.id
+
+def test_invalid_durations_are_reported_to_the_user(client):
+  venue_id, artist_id = venue_and_artist()
+  response = client.post('/shows/create', data={
+    'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-01-01T20:00:00', 'duration': 'abc'})
+  assert b'Show could not be added' in response.data
+  assert db.session.query(Show).count() == 0
+
+def test_overlapping_shows_are_refused(client):
+  venue_id, artist_id = venue_and_artist()
+  booking = {'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-01-01T20:00:00', 'count': 1}
+  assert client.post('/shows/recurring', json=booking).status_code == 201
+
+  response = client.post('/shows/recurring', json=dict(booking, start_time='2030-01-01T21:00:00'))
+  assert response.status_code == 409
+  assert len(response.get_json()['conflicts']) == 1
+  assert db.session.query(Show).count() == 1
+
+def test_bookings_of_unknown_venues_or_artists_are_refused(client):
+  venue_id, artist_id = venue_and_artist()
+  for ids in ({'venue_id': venue_id + 1, 'artist_id': artist_id}, {'venue_id': venue_id, 'artist_id': artist_id + 1}):
+    response = client.post('/shows/recurring', json=dict(ids, start_time='2030-01-01T20:00:00', count=1))
+    assert response.status_code == 400
+  assert db.session.query(Show).count() == 0
+
+def test_a_series_with_one_conflicting_date_books_nothing(client):
+  venue_id, artist_id = venue_and_artist()
+  client.post('/shows/recurring', json={
+    'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-01-15T20:00:00', 'count': 1})
+
+  response = client.post('/shows/recurring', json={
+    'venue_id': venue_id, 'artist_id': artist_id, 'start_time': '2030-01-01T20:00:00',
+    'every_days': 7, 'count': 5})
+  assert response.status_code == 409
+  assert db.session.query(Show).count() == 1
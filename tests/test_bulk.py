@@ -0,0 +1,35 @@
+import io
+import bulk
+from models import db, Venue, Artist, Show
+
+def test_rows_that_do_not_convert_are_skipped(database):
+  venues = 'name,city,state\nThe Hall,Austin,TX\nThe Barn,Austin,TX\n'
+  assert bulk.import_rows('venues', io.StringIO(venues))[:2] == (2, 0)
+  artists = '{"name": "The Band", "city": "Austin", "state": "TX"}\nnot json\n'
+  assert bulk.import_rows('artists', io.StringIO(artists), 'ndjson')[:2] == (1, 1)
+
+  shows = ('venue,artist,venue_id,time\n'
+           'The Hall,The Band,,2030-01-01T20:00:00\n'
+           ',The Band,abc,2030-01-02T20:00:00\n'
+           'The Barn,The Band,,next friday\n'
+           'Nowhere,The Band,,2030-01-03T20:00:00\n')
+  assert bulk.import_rows('shows', io.StringIO(shows), chunk_size=2)[:2] == (1, 3)
+  assert db.session.query(Show.venue_id).scalar() == db.session.query(Venue.id).filter_by(name='The Hall').scalar()
+
+def test_an_export_imported_into_an_empty_database_keeps_its_references(database):
+  bulk.import_rows('venues', io.StringIO('id,name,city,state\n3,The Hall,Austin,TX\n7,The Barn,Austin,TX\n'))
+  bulk.import_rows('artists', io.StringIO('id,name,city,state\n5,The Band,Austin,TX\n'))
+  bulk.import_rows('shows', io.StringIO('artist_id,venue_id,time,duration\n5,7,2030-01-01T20:00:00,45\n'))
+  files = {}
+  for kind in ('venues', 'artists', 'shows'):
+    files[kind] = io.StringIO()
+    bulk.export_rows(kind, files[kind])
+  for model in (Show, Venue, Artist):
+    db.session.query(model).delete()
+  db.session.commit()
+
+  for kind in ('venues', 'artists', 'shows'):
+    bulk.import_rows(kind, io.StringIO(files[kind].getvalue()))
+  show = db.session.query(Show).one()
+  assert (show.venue_id, show.artist_id, show.duration) == (7, 5, 45)
+  assert db.session.get(Venue, 7).name == 'The Barn'
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+import counters
+from models import db, Venue, Artist, Show
+
+def venue_with_shows(shows):
+  venue = Venue(name='The Hall', city='Austin', state='TX')
+  artists = [Artist(name=f'Band {i}', city='Austin', state='TX') for i in range(5)]
+  db.session.add_all([venue, *artists])
+  db.session.flush()
+  now = datetime.now()
+  rows = [{'venue_id': venue.id, 'artist_id': artists[i % 5].id, 'time': now + timedelta(days=i - shows // 2)}
+          for i in range(shows)]
+  db.session.execute(Show.__table__.insert(), rows)
+  counters.add_shows(rows, now)
+  db.session.commit()
+  return venue.id
+
+def delete_statements(client, statements, shows):
+  venue_id = venue_with_shows(shows)
+  with statements() as found:
+    response = client.delete(f'/venues/{venue_id}')
+  assert response.status_code == 302
+  assert db.session.query(Show).count() == 0
+  assert db.session.get(Venue, venue_id) is None
+  db.session.query(Artist).delete()
+  db.session.commit()
+  return len(found)
+
+def test_venue_delete_runs_the_same_statements_for_any_number_of_shows(client, statements):
+  assert delete_statements(client, statements, 10) == delete_statements(client, statements, 100)
@@ -0,0 +1,29 @@
+from jobs import runner
+from models import db, Venue, Show, Job
+from test_deletes import venue_with_shows
+
+def test_enqueue_returns_the_pending_job_of_the_same_entity(app, database):
+  job = Job(kind='delete_venue', params={'venue_id': 1}, status='running')
+  db.session.add(job)
+  db.session.commit()
+  assert runner.enqueue('delete_venue', venue_id=1).id == job.id
+  assert db.session.query(Job).count() == 1
+
+def test_retried_delete_counts_on_from_the_shows_already_deleted(app, database):
+  app.config['JOB_DELETE_CHUNK_SIZE'] = 4
+  try:
+    venue_id = venue_with_shows(10)
+    # an earlier attempt deleted 6 shows before it failed
+    job = Job(kind='delete_venue', params={'venue_id': venue_id}, status='queued',
+              progress=6, total=16, attempts=1)
+    db.session.add(job)
+    db.session.commit()
+    assert runner.run(app, job.id, resubmit=False) == 'succeeded'
+  finally:
+    app.config['JOB_DELETE_CHUNK_SIZE'] = 5000
+  db.session.expire_all()
+  job = db.session.get(Job, job.id)
+  assert (job.progress, job.total) == (16, 16)
+  assert job.message == f'Deleted venue {venue_id} and 16 shows.'
+  assert db.session.query(Show).count() == 0
+  assert db.session.get(Venue, venue_id) is None
@@ -0,0 +1,18 @@
+import seed
+from models import db, Show, Venue, Artist
+
+def listing_statements(client, statements, venues):
+  seed.seed(venues=venues, artists=venues, shows=5 * venues)
+  with statements() as found:
+    response = client.get('/venues')
+  assert response.status_code == 200
+  db.session.query(Show).delete()
+  db.session.query(Venue).delete()
+  db.session.query(Artist).delete()
+  db.session.commit()
+  return len(found)
+
+def test_venues_listing_runs_the_same_queries_for_any_number_of_venues(client, statements):
+  # grouping and upcoming show counts come from the venue rows, not from a
+  # query per venue or area
+  assert listing_statements(client, statements, 20) == listing_statements(client, statements, 200)
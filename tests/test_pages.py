@@ -0,0 +1,31 @@
+from datetime import datetime
+from models import db, Venue
+
+def test_venue_page_changed_by_another_process_is_not_served_from_the_cache(client):
+  venue = Venue(name='The Hall', city='Austin', state='TX', genres=['Jazz'])
+  db.session.add(venue)
+  db.session.commit()
+  assert b'The Hall' in client.get(f'/venues/{venue.id}').data
+
+  # an UPDATE outside this process's session, whose commit events would
+  # drop the cached page
+  with db.engine.begin() as connection:
+    connection.execute(Venue.__table__.update().where(Venue.__table__.c.id == venue.id).values(
+      name='The New Hall', updated_at=datetime.utcnow()))
+  # the test client shares this test's session, a new request would not
+  db.session.expire_all()
+
+  response = client.get(f'/venues/{venue.id}')
+  assert response.headers['X-Cache'] == 'MISS'
+  assert b'The New Hall' in response.data
+
+def test_venues_listing_changes_when_a_venue_is_deleted(client):
+  venues = [Venue(name=name, city='Austin', state='TX', genres=['Jazz']) for name in ('The Hall', 'The Barn')]
+  db.session.add_all(venues)
+  db.session.commit()
+  response = client.get('/venues')
+  assert 'Last-Modified' not in response.headers
+
+  assert client.delete(f'/venues/{venues[0].id}').status_code == 302
+  assert client.get('/venues', headers={'If-None-Match': response.headers['ETag']}).status_code == 200
+  assert client.get('/venues', headers={'If-Modified-Since': 'Tue, 01 Jan 2100 00:00:00 GMT'}).status_code == 200
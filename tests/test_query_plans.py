@@ -0,0 +1,8 @@
+import seed
+from cli import explain_routes
+
+def test_main_routes_query_shows_through_indexes(client):
+  seed.seed(venues=50, artists=50, shows=2000)
+  plans = explain_routes()
+  assert plans
+  assert not [(path, statement, full_scans) for path, statement, full_scans in plans if full_scans]
@@ -0,0 +1,32 @@
+import shutil
+from sqlalchemy import create_engine
+from models import db, Venue
+
+def test_writer_does_not_get_a_page_cached_from_a_lagging_replica(app, database, monkeypatch):
+  venue = Venue(name='The Hall', city='Austin', state='TX', genres=['Jazz'])
+  db.session.add(venue)
+  db.session.commit()
+  venue_id = venue.id
+
+  # a replica stuck at this point in time
+  primary = db.engine.url.database
+  shutil.copy(primary, primary + '.replica')
+  lagging = create_engine(f'sqlite:///{primary}.replica')
+  monkeypatch.setitem(db.engines, 'replica0', lagging)
+
+  writer, reader = app.test_client(), app.test_client()
+  def get(client, url):
+    # every request has its own session, as outside of tests
+    db.session.remove()
+    return client.get(url)
+
+  writer.post(f'/venues/{venue_id}/edit', data={
+    'name': 'The New Hall', 'city': 'Austin', 'state': 'TX', 'address': '', 'phone': '',
+    'genres': 'Jazz', 'image_link': '', 'facebook_link': '', 'website': '', 'seeking_description': ''})
+  get(writer, '/')  # shows the flashed message
+
+  assert b'The New Hall' not in get(reader, f'/venues/{venue_id}').data
+  response = get(writer, f'/venues/{venue_id}')
+  assert response.headers['X-Cache'] == 'MISS'
+  assert b'The New Hall' in response.data
+  lagging.dispose()
@@ -0,0 +1,34 @@
+import threading
+import suggest
+from suggest import suggestions
+from models import db, Venue
+
+def names(found):
+  return sorted(name for id, name in found['venue'])
+
+def test_refresh_keeps_serving_and_replays_changes_made_while_it_reads(app, database, monkeypatch):
+  db.session.add(Venue(name='Blue Hall', city='Austin', state='TX'))
+  db.session.commit()
+  suggestions.build(app)
+  assert names(suggestions.lookup('blu')) == ['Blue Hall']
+
+  # hold the refresh between reading the names and swapping the index in
+  reading, release = threading.Event(), threading.Event()
+  fill = suggest.PrefixIndex.build
+  def held(index, rows):
+    reading.set()
+    release.wait(5)
+    fill(index, rows)
+  monkeypatch.setattr(suggest.PrefixIndex, 'build', held)
+  monkeypatch.setattr(suggestions, 'built_at', float('-inf'))
+  thread = suggestions.refresh()
+  assert reading.wait(5)
+  assert suggestions.refresh() is None
+
+  db.session.add(Venue(name='Bluegrass Barn', city='Austin', state='TX'))
+  db.session.commit()
+  assert names(suggestions.lookup('blu')) == ['Blue Hall', 'Bluegrass Barn']
+  release.set()
+  thread.join(5)
+  assert not suggestions.building
+  assert names(suggestions.lookup('blu')) == ['Blue Hall', 'Bluegrass Barn']
@@ -0,0 +1,112 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, session, make_response, g
+from sqlalchemy import event, inspect
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Page versions.
+#----------------------------------------------------------------------------#
+# Venue, Artist and Show rows carry an updated_at time (UTC), set on insert
+# and on every UPDATE, including the counter updates of counters.py. Each
+# page derives a version from a cheap aggregate over those times:
+#
+#   venue/artist page   the row's updated_at: show counters, and with them
+#                       updated_at, change with every added or removed show
+#   /venues, /artists   max(updated_at) and count(*) of the table
+#   /shows              max(updated_at) of shows, venues and artists
+#
+# The version is sent as a strong ETag along with Last-Modified, and a
+# request whose If-None-Match (or If-Modified-Since) matches is answered
+# with a 304 before the page's queries run or its template renders. The
+# /venues and /artists listings send no Last-Modified: deleting a row
+# changes their count but not max(updated_at), so only the ETag can tell.
+#
+# Show tiles carry the name and image of the other side, so renaming a
+# venue or changing its image touches its artists too (see listen()).
+#
+# The ETag is also kept in g.page_etag for the view, which keys its
+# {% cache %} fragments on it (see fragments.py).
+
+def utcnow():
+  return datetime.utcnow()
+
+def make_etag(*parts):
+  return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+def entity_version(model, id):
+  """(etag, last_modified) of a venue or artist page, or None when the page
+  cannot be versioned: no such row, or shows started since its counters
+  were last rolled over (see counters.py)."""
+  row = db.session.query(model.updated_at, model.next_show_time).filter(model.id == id).first()
+  if row is None or row.updated_at is None:
+    return None
+  if row.next_show_time is not None and row.next_show_time <= datetime.now():
+    return None
+  return make_etag(model.__name__, id, row.updated_at, row.next_show_time), row.updated_at
+
+def table_version(model):
+  # (etag, None) of a listing of `model` rows, see above
+  last_modified, count = db.session.query(db.func.max(model.updated_at), db.func.count()).one()
+  return make_etag(model.__name__, last_modified, count), None
+
+def feed_version():
+  latest = [db.select(db.func.max(model.updated_at)).scalar_subquery() for model in (Show, Venue, Artist)]
+  times = db.session.query(*latest).one()
+  last_modified = max((time for time in times if time is not None), default=None)
+  return make_etag('shows', *times), last_modified
+
+def not_modified(etag, last_modified):
+  # If-None-Match wins over If-Modified-Since when both are sent
+  if request.if_none_match:
+    return request.if_none_match.contains(etag)
+  if request.if_modified_since and last_modified:
+    return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since
+  return False
+
+def conditional(version):
+  """Decorate a page view with conditional GET. version(**view_args)
+  returns (etag, last_modified) or None to always render."""
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      current = version(**kwargs)
+      g.page_etag = current and current[0]
+      # pages carry the flashed messages of the layout, never 304 those
+      if current is None or session.get('_flashes'):
+        return view(**kwargs)
+      etag, last_modified = current
+      if not_modified(etag, last_modified):
+        response = make_response('', 304)
+      else:
+        response = make_response(view(**kwargs))
+      response.set_etag(etag)
+      if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+      # let browsers keep the page, but ask every time whether it changed
+      response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
+
+def listen(session):
+  """Touch the artists playing at a venue whose name or image changes, and
+  the venues of such an artist, as their pages show those on show tiles."""
+
+  @event.listens_for(session, 'before_flush')
+  def touch(sess, flush_context, instances):
+    retitled = {Venue: [], Artist: []}
+    for obj in sess.dirty:
+      if isinstance(obj, (Venue, Artist)) and obj.id is not None:
+        attrs = inspect(obj).attrs
+        if attrs.name.history.has_changes() or attrs.image_link.history.has_changes():
+          retitled[type(obj)].append(obj.id)
+
+    for model, other, column, other_column in ((Venue, Artist, Show.venue_id, Show.artist_id),
+                                               (Artist, Venue, Show.artist_id, Show.venue_id)):
+      if retitled[model]:
+        table = other.__table__
+        sess.connection().execute(table.update().where(table.c.id.in_(
+          db.select(other_column).where(column.in_(retitled[model])))
+        ).values(updated_at=utcnow()))